@@ -1,23 +1,13 @@
 from qdrant_client import QdrantClient
-from qdrant_client.models import Distance, VectorParams
 import os
 from langchain_community.vectorstores import Qdrant
-from vectorstore_setup import get_embedding_model
+from vectorstore_setup import get_embedding_model, provision_collection
 
 AGENTS_REGISTRY = set()
 
-def create_agent(client: QdrantClient, name: str) -> str:
+def create_agent(client: QdrantClient, name: str, expected_points: int = 0) -> str:
     collection_name = f"chatbot_{name}"
-    try:
-        client.get_collection(collection_name)
-    except Exception:
-        client.create_collection(
-            collection_name=collection_name,
-            vectors_config=VectorParams(
-                size=384,
-                distance=Distance.COSINE
-            )
-        )
+    provision_collection(client, collection_name, expected_points)
     return collection_name
 
 def get_all_agent_names():
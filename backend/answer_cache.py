@@ -0,0 +1,129 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from chatbot_generations import CHATBOT_GENERATIONS, ChatbotGenerations
+
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+# Cosine similarity above which a new question counts as a repeat of a cached one
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "3600"))
+# Cached answers kept per chatbot
+ANSWER_CACHE_PER_BOT = int(os.getenv("ANSWER_CACHE_PER_BOT", "256"))
+
+
+class SemanticAnswerCache:
+    """Per-chatbot cache of answers, looked up by question embedding.
+
+    A question whose vector is close enough to a cached question's gets the
+    cached answer and sources, skipping retrieval and the LLM. Entries
+    expire after `ttl` seconds. Entries belong to the chatbot's generation
+    (see ChatbotGenerations) they were answered at: when it is re-indexed
+    or its settings change, in this worker or another, they are dropped on
+    the next lookup.
+    """
+
+    def __init__(self, threshold: float = ANSWER_CACHE_THRESHOLD, ttl: float = ANSWER_CACHE_TTL,
+                 max_per_bot: int = ANSWER_CACHE_PER_BOT, generations: ChatbotGenerations = CHATBOT_GENERATIONS):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_per_bot = max_per_bot
+        self.generations = generations
+        # chatbot_id -> OrderedDict(question -> (unit vector, answer, sources, expires_at))
+        self._bots = {}
+        # chatbot_id -> generation the entries in _bots were answered at
+        self._bot_generations = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _unit(vector) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def generation(self, chatbot_id: str) -> int:
+        """Current generation of a chatbot; read it before retrieval and pass it to get() and put()."""
+        return self.generations.get(chatbot_id)
+
+    def get(self, chatbot_id: str, query_vector, generation: int) -> Optional[Tuple[str, List[str]]]:
+        """(answer, sources) cached for a near-identical question, or None."""
+        query = self._unit(query_vector)
+        now = time.monotonic()
+        chatbot_id = str(chatbot_id)
+        with self._lock:
+            if self._bot_generations.get(chatbot_id) != generation:
+                # Changed since these answers were cached
+                if self._bots.pop(chatbot_id, None):
+                    self.invalidations += 1
+                self._bot_generations[chatbot_id] = generation
+            entries = self._bots.get(chatbot_id)
+            if entries:
+                for question in [q for q, entry in entries.items() if entry[3] <= now]:
+                    del entries[question]
+            if not entries:
+                self.misses += 1
+                return None
+            questions = list(entries)
+            similarities = np.stack([entries[q][0] for q in questions]) @ query
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.threshold:
+                self.misses += 1
+                return None
+            question = questions[best]
+            entries.move_to_end(question)
+            self.hits += 1
+            _, answer, sources, _ = entries[question]
+            return answer, list(sources)
+
+    def put(self, chatbot_id: str, question: str, query_vector, answer: str, sources: List[str], generation: int):
+        chatbot_id = str(chatbot_id)
+        with self._lock:
+            if self._bot_generations.get(chatbot_id) != generation:
+                # Answered from documents that changed in the meantime
+                return
+            entries = self._bots.setdefault(chatbot_id, OrderedDict())
+            entries[question] = (self._unit(query_vector), answer, list(sources), time.monotonic() + self.ttl)
+            entries.move_to_end(question)
+            while len(entries) > self.max_per_bot:
+                entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, chatbot_id: str):
+        """Drop a chatbot's answers here; other workers follow CHATBOT_GENERATIONS.bump()."""
+        with self._lock:
+            self._bot_generations.pop(str(chatbot_id), None)
+            if self._bots.pop(str(chatbot_id), None):
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._bots.clear()
+            self._bot_generations.clear()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        with self._lock:
+            entries = sum(len(entries) for entries in self._bots.values())
+            chatbots = len(self._bots)
+        return {
+            "chatbots": chatbots,
+            "entries": entries,
+            "threshold": self.threshold,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+ANSWER_CACHE = SemanticAnswerCache() if ANSWER_CACHE_ENABLED else None
@@ -5,14 +5,13 @@ from supabase import create_client, Client
 from dotenv import load_dotenv
 from postgrest import APIError
 from passlib.context import CryptContext
-import datetime, jwt, logging, os, asyncio
+import datetime, jwt, logging, os
 from datetime import datetime, timedelta
 from fastapi.responses import JSONResponse
-from document_loader import load_and_split_pdf
-from vectorstore_setup import get_qdrant_client, get_vectorstore
+from vectorstore_setup import get_qdrant_client, get_async_qdrant_client, get_vectorstore, get_embedding_model, search_params_for, QDRANT_REGISTRY, COLLECTION_REGISTRY, EMBEDDING_CACHE, QUERY_EMBEDDING_CACHE, QUERY_BATCHER, EMBEDDING_SERVICE
+from fastapi.concurrency import run_in_threadpool
 from uuid import uuid4
 from fastapi.responses import HTMLResponse
-from agents import create_agent
 from langchain_community.vectorstores import Qdrant
 from langchain_core.documents import Document
 from langchain.chains import RetrievalQA
@@ -21,10 +20,18 @@ from searchbot_graph import handle_search_query, ChatRequest
 from sqlalchemy import create_engine, inspect
 from fastapi.responses import JSONResponse
 from typing import List, Optional
-from document_loader import scrape_website
 from utils.email import send_verification_email, send_password_reset_email
-from fastapi.responses import FileResponse
-from llm_utils import get_llm
+from fastapi.responses import FileResponse, StreamingResponse
+from llm_utils import get_llm, LLM_POOL
+from chatbot_cache import CHATBOT_CONFIG_CACHE, ChatbotConfig
+from answer_cache import ANSWER_CACHE
+from ingestion import INGESTION_QUEUE, JOB_STORE, WEBSITE_REFRESHER
+from document_store import DOCUMENT_STORE
+from collection_versions import COLLECTION_VERSIONS
+from crawl_state import CRAWL_STATE
+from collection_placement import COLLECTION_PLACEMENT
+from local_index import LOCAL_INDEX
+from chatbot_generations import CHATBOT_GENERATIONS
 from fastapi.staticfiles import StaticFiles
 import shutil
 import json
@@ -65,7 +72,31 @@ frontend_dist_dir = os.path.join(parent_dir, "frontend", "dist")
 STATIC_DIR = os.path.join(os.path.dirname(__file__), '..', 'frontend', 'dist')  # no static/
 PLUGIN_ZIP_DIR = os.path.join(os.path.dirname(__file__), '..', 'frontend', 'plugmind-chatbot')
 app.mount("/plugins", StaticFiles(directory=PLUGIN_ZIP_DIR), name="plugins")
-app.mount("/chatbot/static", StaticFiles(directory=STATIC_DIR), name="chatbot-static")# Auth utilities
+app.mount("/chatbot/static", StaticFiles(directory=STATIC_DIR), name="chatbot-static")
+
+# Shared Qdrant client: connect once, keep it healthy in the background
+@app.on_event("startup")
+async def startup_qdrant():
+    QDRANT_REGISTRY.start()
+    try:
+        COLLECTION_REGISTRY.sync(get_qdrant_client())
+    except Exception as e:
+        logging.warning(f"Could not seed collection registry: {str(e)}")
+
+@app.on_event("startup")
+async def startup_ingestion():
+    INGESTION_QUEUE.start()
+    COLLECTION_VERSIONS.start_gc()
+    WEBSITE_REFRESHER.start()
+
+@app.on_event("shutdown")
+async def shutdown_qdrant():
+    INGESTION_QUEUE.stop()
+    COLLECTION_VERSIONS.stop_gc()
+    WEBSITE_REFRESHER.stop()
+    QDRANT_REGISTRY.stop()
+
+# Auth utilities
 async def verify_token(authorization: str = Header(...), required_role: str = 'user') -> str:
     try:
         scheme, token = authorization.split()
@@ -195,6 +226,19 @@ async def verify_token(authorization: str = Header(...), required_role: str = 'u
     except Exception:
         raise HTTPException(status_code=401, detail="Invalid authorization token")
 
+@app.get("/metrics/cache")
+async def cache_metrics():
+    return {
+        "chatbot_config": CHATBOT_CONFIG_CACHE.stats(),
+        "llm_pool": LLM_POOL.stats(),
+        "embedding_cache": EMBEDDING_CACHE.stats() if EMBEDDING_CACHE else None,
+        "query_embeddings": QUERY_EMBEDDING_CACHE.stats(),
+        "query_batcher": QUERY_BATCHER.stats() if QUERY_BATCHER else None,
+        "embedding_service": EMBEDDING_SERVICE.stats() if EMBEDDING_SERVICE else None,
+        "answer_cache": ANSWER_CACHE.stats() if ANSWER_CACHE else None,
+        "local_index": LOCAL_INDEX.stats() if LOCAL_INDEX else None
+    }
+
 @app.get("/chatbots/{chatbot_id}/status")
 async def get_chatbot_status(chatbot_id: str):
     return {"status": "online"}
@@ -432,6 +476,23 @@ from urllib.parse import urlparse
 from langdetect import detect
 from llm_utils import get_llm, get_rag_chain
 
+def sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+def chat_response(answer: str, sources: list, stream: bool):
+    """Plain JSON reply, or the same reply as a one-shot SSE stream."""
+    if not stream:
+        return {"answer": answer, "sources": sources}
+
+    async def events():
+        yield sse_event("token", {"token": answer})
+        yield sse_event("sources", {"sources": sources})
+        yield sse_event("done", {})
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers=SSE_HEADERS)
+
 @app.post("/chatbot/chat/{chatbot_id}")
 async def chat_with_bot(chatbot_id: str, request: Request):
     try:
@@ -443,6 +504,8 @@ async def chat_with_bot(chatbot_id: str, request: Request):
             query = data.get("message", "").strip()
             if not query:
                 raise ValueError("Missing 'message' in request body")
+            # Stream tokens as Server-Sent Events when asked to
+            stream = bool(data.get("stream")) or "text/event-stream" in request.headers.get("accept", "")
         except Exception as e:
             print(f"❌ Invalid JSON body: {str(e)}")
             raise HTTPException(422, "Invalid or missing JSON body with 'message'")
@@ -450,21 +513,27 @@ async def chat_with_bot(chatbot_id: str, request: Request):
         print(f"🔍 Chat request for chatbot {chatbot_id}")
         print(f"📝 Query: {query}")
 
-        # Fetch chatbot settings from Supabase
-        try:
-            chatbot = supabase.table('chatbots').select('*').eq('id', chatbot_id).single().execute()
-            if not chatbot.data:
-                raise HTTPException(404, "Chatbot not found")
-            chatbot_data = chatbot.data
-            print(f"✅ Found chatbot: {chatbot_data}")
-        except Exception as e:
-            print(f"❌ Error fetching chatbot: {str(e)}")
-            raise HTTPException(500, "Error accessing chatbot")
+        # Chatbot settings: cached, Supabase is only hit on a miss
+        chatbot_config = CHATBOT_CONFIG_CACHE.get(chatbot_id)
+        if chatbot_config is None:
+            try:
+                # supabase-py 1.x has no async client, keep the call off the event loop
+                chatbot = await run_in_threadpool(
+                    supabase.table('chatbots').select('id,temperature,max_tokens,model,website_url,greeting_message').eq('id', chatbot_id).single().execute
+                )
+                if not chatbot.data:
+                    raise HTTPException(404, "Chatbot not found")
+                chatbot_config = ChatbotConfig.from_row(chatbot.data)
+                CHATBOT_CONFIG_CACHE.put(chatbot_config)
+                print(f"✅ Found chatbot: {chatbot_config}")
+            except Exception as e:
+                print(f"❌ Error fetching chatbot: {str(e)}")
+                raise HTTPException(500, "Error accessing chatbot")
 
         # LLM configuration
-        temperature = chatbot_data.get("temperature", 0.7)
-        max_tokens = chatbot_data.get("max_tokens", 1000)
-        model = chatbot_data.get("model", "mistralai/mistral-7b-instruct:free")
+        temperature = chatbot_config.temperature
+        max_tokens = chatbot_config.max_tokens
+        model = chatbot_config.model
         print(f"🧠 LLM config: model={model}, temp={temperature}, max_tokens={max_tokens}")
 
         # Utility: extract support email
@@ -490,7 +559,7 @@ async def chat_with_bot(chatbot_id: str, request: Request):
         lang = get_user_language(query)
         print(f"🌍 Detected language: {lang}")
 
-        support_email = get_support_email(chatbot_data.get("website_url", ""))
+        support_email = get_support_email(chatbot_config.website_url)
         fallback_messages = {
             "fr": f"❗ Je suis désolé, je ne dispose pas de cette information. Veuillez contacter le support du site : {support_email}",
             "en": f"❗ I'm sorry, I don't have this information. Please contact our website support: {support_email}",
@@ -500,22 +569,22 @@ async def chat_with_bot(chatbot_id: str, request: Request):
 
         # Greeting shortcut
         if is_greeting(query):
-            return {
-                "answer": chatbot_data.get("greeting_message", "Bonjour ! Comment puis-je vous aider ? 😊"),
-                "sources": []
-            }
-
-        # Vectorstore setup
-        collection_name = f"chatbot_{chatbot_id}"
-        print(f"📚 Using collection: {collection_name}")
+            return chat_response(chatbot_config.greeting_message, [], stream)
 
+        # Vectorstore setup: the chatbot's own collection, or its share of a pooled one
         try:
             qdrant = get_qdrant_client()
-            collections = qdrant.get_collections().collections
-            if not any(col.name == collection_name for col in collections):
+            placement = await run_in_threadpool(COLLECTION_PLACEMENT.resolve, qdrant, chatbot_id)
+            if placement is None or (
+                not placement.shared and not await run_in_threadpool(COLLECTION_REGISTRY.exists, qdrant, placement.collection_name)
+            ):
                 raise HTTPException(404, "Chatbot documents not found. Please upload documents first.")
-            vectorstore = get_vectorstore(qdrant, collection_name)
+            print(f"📚 Using collection: {placement.collection_name}")
+            vectorstore = await run_in_threadpool(get_vectorstore, qdrant, placement.collection_name, get_async_qdrant_client())
+            search_params = await run_in_threadpool(search_params_for, qdrant, placement.collection_name)
             print("✅ Vectorstore ready")
+        except HTTPException:
+            raise
         except Exception as e:
             print(f"❌ Error preparing vectorstore: {str(e)}")
             raise HTTPException(500, "Vectorstore setup failed")
@@ -524,34 +593,70 @@ async def chat_with_bot(chatbot_id: str, request: Request):
             llm = get_llm(temperature=temperature, max_tokens=max_tokens, model=model)
             print("✅ LLM initialized")
 
-            retriever = vectorstore.as_retriever(
-                search_type="similarity",
-                search_kwargs={"k": 3, "score_threshold": 0.5}
-            )
-            print("✅ Retriever ready")
-
-            docs = retriever.get_relevant_documents(query)
+            # Embedding is CPU-bound: run it in the thread pool, search with the async client
+            query_vector = await run_in_threadpool(get_embedding_model().embed_query, query)
+
+            # Repeated question: answer from the semantic cache, no search or LLM call.
+            # The generation is read first, so answers from documents replaced during
+            # this request are not cached.
+            generation = await run_in_threadpool(ANSWER_CACHE.generation, chatbot_id) if ANSWER_CACHE else None
+            cached = await run_in_threadpool(ANSWER_CACHE.get, chatbot_id, query_vector, generation) if ANSWER_CACHE else None
+            if cached is not None:
+                print("♻️ Answer served from semantic cache")
+                return chat_response(cached[0], cached[1], stream)
+
+            # Hot small chatbots are searched in-process (a memmap, so in the thread pool), the rest in Qdrant
+            local_results = await run_in_threadpool(
+                LOCAL_INDEX.search, placement, query_vector, 3, 0.5
+            ) if LOCAL_INDEX else None
+            if local_results is not None:
+                docs = [doc for doc, _ in local_results]
+            else:
+                docs = await vectorstore.asimilarity_search_by_vector(
+                    query_vector, k=3, score_threshold=0.5, filter=placement.points_filter(), search_params=search_params
+                )
             if not docs or all(not doc.page_content.strip() for doc in docs):
-                return {
-                    "answer": fallback_msg,
-                    "sources": []
-                }
+                return chat_response(fallback_msg, [], stream)
 
             context = "\n\n".join(doc.page_content for doc in docs if doc.page_content.strip())
-            rag_chain = get_rag_chain(llm, context, query, chatbot_data.get("website_url", ""))
-            answer = rag_chain.invoke({})
-
-            return {
-                "answer": answer,
-                "sources": [doc.page_content for doc in docs]
-            }
+            rag_chain = get_rag_chain(llm, context, query, chatbot_config.website_url)
+            sources = [doc.page_content for doc in docs]
+
+            if stream:
+                async def events():
+                    sent_tokens = False
+                    tokens = []
+                    try:
+                        async for token in rag_chain.astream({}):
+                            if token:
+                                sent_tokens = True
+                                tokens.append(token)
+                                yield sse_event("token", {"token": token})
+                    except Exception as e:
+                        print(f"❌ Error while streaming answer: {str(e)}")
+                        if not sent_tokens:
+                            yield sse_event("token", {"token": fallback_msg})
+                            yield sse_event("sources", {"sources": []})
+                            yield sse_event("done", {})
+                            return
+                        yield sse_event("error", {"message": str(e)})
+                    else:
+                        if ANSWER_CACHE:
+                            ANSWER_CACHE.put(chatbot_id, query, query_vector, "".join(tokens), sources, generation)
+                    yield sse_event("sources", {"sources": sources})
+                    yield sse_event("done", {})
+
+                return StreamingResponse(events(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+            answer = await rag_chain.ainvoke({})
+            if ANSWER_CACHE:
+                ANSWER_CACHE.put(chatbot_id, query, query_vector, answer, sources, generation)
+
+            return chat_response(answer, sources, stream)
 
         except Exception as e:
             print(f"❌ Error during RAG processing: {str(e)}")
-            return {
-                "answer": fallback_msg,
-                "sources": []
-            }
+            return chat_response(fallback_msg, [], stream)
 
     except HTTPException as he:
         print(f"❌ HTTP Exception: {str(he)}")
@@ -583,98 +688,101 @@ async def update_chatbot(
     website_url: Optional[str] = Form(None),
     existing_files: str = Form("[]"),
     files: List[UploadFile] = File([]),
+    rebuild: bool = Form(False),
     user_id: str = Depends(get_current_user)
 ):
     try:
         print("🛠️ UPDATE chatbot_id:", chatbot_id)
         print("🛠️ USER_ID:", user_id)
 
-        # Step 1: Parse existing file paths
+        current = supabase.table("chatbots").select("pdf_paths, website_url").eq("id", chatbot_id).eq("user_id", user_id).single().execute()
+        if not current.data:
+            raise HTTPException(404, "Chatbot not found or not yours.")
+        previous_files = current.data.get("pdf_paths") or []
+        if isinstance(previous_files, str):
+            previous_files = [p.strip() for p in previous_files.split(",") if p.strip()]
+
+        # Step 1: Parse existing file paths; only files the chatbot already has can be kept
         existing_file_list = json.loads(existing_files)
+        unknown_files = [p for p in existing_file_list if p not in previous_files]
+        if unknown_files:
+            raise HTTPException(400, f"Unknown existing files: {unknown_files}")
         all_files = []
+        # Uploads the chatbot did not reference before this update
+        new_paths = []
 
-        # Step 2: Save new files
-        pdf_dir = "uploaded_pdfs"
-        os.makedirs(pdf_dir, exist_ok=True)
-        new_chunks = []
-
-        for file in files:
-            filename = f"{uuid4()}_{file.filename}"
-            file_path = os.path.join(pdf_dir, filename)
-            with open(file_path, "wb") as f:
-                f.write(await file.read())
-            all_files.append(file_path)
-
-            ext = os.path.splitext(file.filename)[1].lower()
-            if ext == ".pdf":
-                new_chunks += load_and_split_pdf(file_path)
-            elif ext == ".xml":
-                from document_loader import load_and_split_xml
-                new_chunks += load_and_split_xml(file_path)
-
-        # Add kept old files
-        all_files.extend(existing_file_list)
-
-        # Step 3: Update Supabase metadata
-        update_data = {
-            "name": name,
-            "description": description,
-            "greeting_message": greeting_message,
-            "prompt": prompt,
-            "temperature": temperature,
-            "max_tokens": max_tokens,
-            "model": model,
-            "website_url": website_url,
-            "pdf_paths": all_files,
-            "updated_at": datetime.utcnow().isoformat()
-        }
-
-        resp = supabase.table("chatbots").update(update_data).eq("id", chatbot_id).eq("user_id", user_id).execute()
-        if not resp.data:
-            raise HTTPException(404, "Chatbot not found or not yours.")
-
-        # Step 4: Regenerate embeddings if any change in files
-        original_files = set(existing_file_list)
-        updated_files = set(all_files)
-        if original_files != updated_files or files:
-            print("🧹 Files changed, re-creating vectorstore")
+        try:
+            # Step 2: Save new files (content-addressed, identical files are stored once)
+            for file in files:
+                _, file_path = DOCUMENT_STORE.save(await file.read(), file.filename, chatbot_id)
+                all_files.append(file_path)
+                if file_path not in previous_files and file_path not in new_paths:
+                    new_paths.append(file_path)
 
-            qdrant = get_qdrant_client()
-            collection_name = f"chatbot_{chatbot_id}"
+            # Add kept old files
+            all_files.extend(existing_file_list)
 
-            # Delete old collection
-            try:
-                qdrant.delete_collection(collection_name=collection_name)
-            except Exception as e:
-                print(f"⚠️ Couldn't delete old collection: {e}")
+            # Step 3: Update Supabase metadata
+            update_data = {
+                "name": name,
+                "description": description,
+                "greeting_message": greeting_message,
+                "prompt": prompt,
+                "temperature": temperature,
+                "max_tokens": max_tokens,
+                "model": model,
+                "website_url": website_url,
+                "pdf_paths": all_files,
+                "updated_at": datetime.utcnow().isoformat()
+            }
 
-            # Recreate
+            resp = supabase.table("chatbots").update(update_data).eq("id", chatbot_id).eq("user_id", user_id).execute()
+            if not resp.data:
+                raise HTTPException(404, "Chatbot not found or not yours.")
+        except Exception:
+            # The chatbot does not point at the new uploads: drop their references
+            for path in new_paths:
+                DOCUMENT_STORE.release(chatbot_id, path)
+            raise
+        CHATBOT_CONFIG_CACHE.invalidate(chatbot_id)
+        # Cached answers (and in-process indexes) of every worker are dropped
+        CHATBOT_GENERATIONS.bump(chatbot_id)
+        if ANSWER_CACHE:
+            ANSWER_CACHE.invalidate(chatbot_id)
+
+        # New uploads were referenced when saved; removed files are released
+        for path in set(previous_files) - set(all_files):
             try:
-                create_agent(qdrant, str(chatbot_id))
+                if DOCUMENT_STORE.release(chatbot_id, path):
+                    print(f"✅ Deleted unreferenced file: {path}")
             except Exception as e:
-                raise HTTPException(500, f"Failed to recreate agent: {str(e)}")
-
-            # Optional: scrape site
-            scraped_chunks = []
-            if website_url:
-                try:
-                    scraped_chunks = scrape_website(website_url)
-                except Exception as e:
-                    print(f"⚠️ Failed scraping site: {e}")
+                print(f"⚠️ Error releasing file {path}: {str(e)}")
 
-            all_chunks = new_chunks + scraped_chunks
-            vectorstore = get_vectorstore(qdrant, collection_name)
-
-            for i in range(0, len(all_chunks), 5):
-                batch = all_chunks[i:i + 5]
-                try:
-                    vectorstore.add_documents(batch)
-                    print(f"✅ Processed batch {i//5 + 1}")
-                except Exception as e:
-                    print(f"⚠️ Batch {i//5 + 1} error: {str(e)}")
+        # Step 4: Regenerate embeddings in the background if any change in files
+        job = None
+        original_files = set(previous_files)
+        updated_files = set(all_files)
+        # A website that stays the same is re-crawled by WEBSITE_REFRESHER, not on every edit
+        website_changed = (website_url or None) != (current.data.get("website_url") or None)
+        if original_files != updated_files or files or rebuild or website_changed:
+            # Incremental: only added files are embedded, removed ones are dropped,
+            # and the website is re-crawled conditionally (changed pages only).
+            # rebuild re-indexes everything into a new version behind the alias.
+            job = INGESTION_QUEUE.enqueue(chatbot_id, user_id, "update", {
+                "files": all_files,
+                "website_url": website_url,
+                "rebuild": rebuild
+            })
+            print(f"📨 Queued ingestion job {job['id']}")
 
-        return {"updated": True, "chatbot": resp.data[0]}
+        return {
+            "updated": True,
+            "chatbot": resp.data[0],
+            "job_id": job["id"] if job else None
+        }
 
+    except HTTPException:
+        raise
     except Exception as e:
         print("❌ Error during chatbot update:", str(e))
         raise HTTPException(500, str(e))
@@ -809,20 +917,17 @@ async def create_chatbot_from_pdf(
     website_url: Optional[str] = Form(None),  
     user_id: str = Depends(get_current_user)
 ):
+    # Uploads are referenced by a placeholder owner until the chatbot has an id
+    pdf_paths = []
+    upload_owner = f"upload:{uuid4().hex}"
     try:
         print("🟢 /chatbot/pdf called with:", name, description)
 
-        # Step 1: Save uploaded PDF
-        pdf_dir = "uploaded_pdfs"
-        os.makedirs(pdf_dir, exist_ok=True)
-        pdf_paths = []
-
+        # Step 1: Save uploaded PDF (content-addressed, identical files are stored once)
         for file in files:
-            filename = f"{uuid4()}_{file.filename}"
-            path = os.path.join(pdf_dir, filename)
-            with open(path, "wb") as f:
-                f.write(await file.read())
-            pdf_paths.append(path)
+            _, path = DOCUMENT_STORE.save(await file.read(), file.filename, upload_owner)
+            if path not in pdf_paths:
+                pdf_paths.append(path)
 
         # Step 2: Insert chatbot metadata into Supabase (to get chatbot_id)
         print("🛠 Inserting chatbot metadata to Supabase...")
@@ -841,99 +946,40 @@ async def create_chatbot_from_pdf(
 
         chatbot_id = resp.data[0]["id"]
         collection_name = f"chatbot_{chatbot_id}"
+        DOCUMENT_STORE.move_refs(upload_owner, chatbot_id)
 
-        # Step 3: Initialize Qdrant client
-        print("🔧 Initializing Qdrant client...")
-        qdrant = get_qdrant_client()
-
-        # Step 4: Create agent and collection
-        print("🤖 Creating agent and collection...")
-        try:
-            create_agent(qdrant, str(chatbot_id))
-            print("✅ Agent and collection created successfully")
-        except Exception as e:
-            print(f"⚠️ Error creating agent/collection: {str(e)}")
-            # If collection already exists, that's fine - we'll use it
-            if "already exists" not in str(e).lower():
-                raise HTTPException(500, f"Error creating agent: {str(e)}")
-
-        # Step 5: Load + split PDF into chunks
-        print("📄 Loading and splitting files...")
-        chunks = []
-        for path in pdf_paths:
-            ext = os.path.splitext(path)[1].lower()
-            print(f"📂 Processing file: {path} as {ext}")
-            try:
-                if ext == ".pdf":
-                    chunks.extend(load_and_split_pdf(path))
-                elif ext == ".xml":
-                    from document_loader import load_and_split_xml
-                    chunks.extend(load_and_split_xml(path))
-                else:
-                    print(f"⚠️ Skipping unsupported file: {path}")
-            except Exception as e:
-                print(f"❌ Error loading {path}: {str(e)}")
-                raise HTTPException(500, f"Failed to load and split {path}: {str(e)}")
-        scraped_chunks = [] 
-        if website_url:
-            try:
-                print(f"🌐 Scraping website: {website_url}")
-                scraped_chunks = scrape_website(website_url)
-                print(f"✅ Scraped {len(scraped_chunks)} chunks")
-            except Exception as e:
-                print(f"⚠️ Failed to scrape site: {e}")
-
-        # Step 6: Store embeddings
-        all_chunks = chunks + scraped_chunks
-        print(f"📦 Total chunks to process: {len(all_chunks)}")
-        vectorstore = get_vectorstore(qdrant, collection_name)
- 
-        # Process chunks in batches to avoid timeouts
-        BATCH_SIZE = 5  # Reduced batch size
-        
-        
-        try:
-            for i in range(0, len(all_chunks), BATCH_SIZE):
-                batch = all_chunks[i:i + BATCH_SIZE]
-                print(f"🔄 Processing batch {i//BATCH_SIZE + 1}/{(len(all_chunks) + BATCH_SIZE - 1)//BATCH_SIZE}")
-                try:
-                    vectorstore.add_documents(batch)
-                    print(f"✅ Processed batch {i//BATCH_SIZE + 1}")
-                except asyncio.TimeoutError:
-                    print(f"⚠️ Batch {i//BATCH_SIZE + 1} timed out, but continuing with next batch")
-                    continue
-                except Exception as e:
-                    print(f"⚠️ Error processing batch {i//BATCH_SIZE + 1}: {str(e)}")
-                    continue
-
-            # Update chatbot metadata in Supabase
-            print("✅ All batches processed, updating metadata")
-            supabase.table("chatbots").update({
-                "updated_at": datetime.utcnow().isoformat()
-            }).eq("id", chatbot_id).execute()
-
-        except Exception as e:
-            print(f"❌ Error during vectorization: {str(e)}")
-            return {
-                "status": "partial_success",
-                "message": "Agent created but PDF processing is still in progress",
-                "id": chatbot_id,
-                "collection": collection_name
-            }
+        # Step 3: Parse, split and embed in the background
+        job = INGESTION_QUEUE.enqueue(chatbot_id, user_id, "create", {
+            "files": pdf_paths,
+            "website_url": website_url
+        })
+        print(f"📨 Queued ingestion job {job['id']}")
 
-        # Step 7: Return success response
+        # Step 4: Return right away, progress is on /jobs/{job_id}
         return {
-            "message": "Chatbot created successfully",
+            "message": "Chatbot created successfully, documents are being processed",
             "id": chatbot_id,
             "collection": collection_name,
+            "job_id": job["id"],
+            "status": job["status"],
             "embed_code": f"<iframe src='http://localhost:8000/chatbot/embed/{chatbot_id}' width='100%' height='600px'></iframe>"
         }
 
     except Exception as e:
         print(f"❌ Error creating chatbot: {str(e)}")
         # If we get here, something went wrong before we could create the chatbot
+        for path in pdf_paths:
+            DOCUMENT_STORE.release(upload_owner, path)
         raise HTTPException(500, f"Failed to create chatbot: {str(e)}")
 
+@app.get("/jobs/{job_id}")
+async def get_ingestion_job(job_id: str, user_id: str = Depends(get_current_user)):
+    job = JOB_STORE.get(job_id)
+    if not job or job["user_id"] != str(user_id):
+        raise HTTPException(404, "Job not found")
+    job.pop("payload", None)
+    return job
+
 
 
 # UPDATE CURRENT LOGGED-IN USER
@@ -1025,6 +1071,10 @@ async def delete_user(user_id: str):
         supabase.table('refresh_tokens').delete().eq('user_id', user_id).execute()
         # Delete chatbots and searchbots
         supabase.table('chatbots').delete().eq('user_id', user_id).execute()
+        CHATBOT_CONFIG_CACHE.clear()
+        CHATBOT_GENERATIONS.bump_all()
+        if ANSWER_CACHE:
+            ANSWER_CACHE.clear()
         supabase.table('searchbots').delete().eq('user_id', user_id).execute()
         # Delete user from 'users'
         supabase.table('users').delete().eq('id', user_id).execute()
@@ -1226,11 +1276,22 @@ async def delete_chatbot(chatbot_id: str, user_id: str = Depends(get_current_use
         if not chatbot.data:
             raise HTTPException(404, "Chatbot not found or you don't have permission to delete it")
 
-        # Step 2: Delete Qdrant collection
+        # Other workers stop answering from their cached answers and in-process copies
+        CHATBOT_GENERATIONS.bump(chatbot_id)
+
+        # Step 2: Delete Qdrant collection (alias and all its versions)
         try:
             collection_name = f"chatbot_{chatbot_id}"
             qdrant = get_qdrant_client()
-            qdrant.delete_collection(collection_name=collection_name)
+            placement = COLLECTION_PLACEMENT.resolve(qdrant, chatbot_id)
+            if placement is not None and placement.shared:
+                COLLECTION_PLACEMENT.delete_points(qdrant, placement)
+            COLLECTION_VERSIONS.drop_chatbot(qdrant, chatbot_id)
+            COLLECTION_PLACEMENT.forget(chatbot_id)
+            if LOCAL_INDEX:
+                LOCAL_INDEX.invalidate(chatbot_id)
+            CRAWL_STATE.drop_chatbot(chatbot_id)
+            DOCUMENT_STORE.forget_indexed(chatbot_id)
             print(f"✅ Deleted Qdrant collection: {collection_name}")
         except Exception as e:
             print(f"⚠️ Error deleting Qdrant collection: {str(e)}")
@@ -1243,8 +1304,8 @@ async def delete_chatbot(chatbot_id: str, user_id: str = Depends(get_current_use
                 pdf_paths = pdf_paths.split(",")
             
             for path in pdf_paths:
-                if os.path.exists(path):
-                    os.remove(path)
+                # Shared documents stay on disk until their last chatbot is gone
+                if DOCUMENT_STORE.release(chatbot_id, path):
                     print(f"✅ Deleted PDF file: {path}")
         except Exception as e:
             print(f"⚠️ Error deleting PDF files: {str(e)}")
@@ -1254,6 +1315,9 @@ async def delete_chatbot(chatbot_id: str, user_id: str = Depends(get_current_use
         resp = supabase.table("chatbots").delete().eq("id", chatbot_id).eq("user_id", user_id).execute()
         if not resp.data:
             raise HTTPException(500, "Failed to delete chatbot from database")
+        CHATBOT_CONFIG_CACHE.invalidate(chatbot_id)
+        if ANSWER_CACHE:
+            ANSWER_CACHE.invalidate(chatbot_id)
 
         print(f"✅ Successfully deleted chatbot {chatbot_id}")
         return {"deleted": True, "message": "Chatbot and associated data deleted successfully"}
@@ -0,0 +1,119 @@
+"""Recall@k, RAM and latency of each collection profile on our own chunks.
+
+    python benchmark_collections.py --source chatbot_42 [--queries 200] [--k 3]
+
+Vectors are read from an existing chatbot collection (--source, repeatable)
+and loaded into one temporary collection per profile. A sample of the
+chunks is held out as queries. Each profile's search (its hnsw_ef, and
+rescoring when quantized) is compared with exact search on the same data.
+RAM is an estimate from the profile: vectors held in memory plus HNSW
+links. Temporary collections are deleted at the end.
+"""
+import argparse
+import random
+import time
+
+import numpy as np
+from qdrant_client.models import CollectionStatus, PointStruct, SearchParams
+
+from vectorstore_setup import (
+    COLLECTION_DIMENSIONS,
+    COLLECTION_PROFILES,
+    get_qdrant_client,
+    provision_collection,
+    search_params_for,
+    COLLECTION_REGISTRY,
+    PROVISIONED_PROFILES,
+)
+
+
+def load_vectors(client, sources: list) -> np.ndarray:
+    vectors = []
+    for source in sources:
+        offset = None
+        while True:
+            points, offset = client.scroll(
+                collection_name=source, limit=1000, offset=offset, with_payload=False, with_vectors=True
+            )
+            vectors.extend(point.vector for point in points)
+            if offset is None:
+                break
+    return np.asarray(vectors, dtype=np.float32)
+
+
+def estimated_ram_mb(profile, count: int) -> float:
+    vector_bytes = count * COLLECTION_DIMENSIONS * (1 if profile.quantize else 4)
+    if profile.quantize and not profile.on_disk:
+        vector_bytes += count * COLLECTION_DIMENSIONS * 4
+    # Layer 0 keeps 2*m links per point, 4 bytes each
+    graph_bytes = count * profile.m * 2 * 4
+    return (vector_bytes + graph_bytes) / 1024 / 1024
+
+
+def wait_until_indexed(client, collection_name: str, timeout: float = 600):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if client.get_collection(collection_name).status == CollectionStatus.GREEN:
+            return
+        time.sleep(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--source", action="append", required=True, help="collection to take chunk vectors from")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    client = get_qdrant_client()
+    vectors = load_vectors(client, args.source)
+    if len(vectors) <= args.queries:
+        raise SystemExit(f"Need more than {args.queries} chunks, found {len(vectors)}")
+
+    rng = random.Random(args.seed)
+    query_ids = set(rng.sample(range(len(vectors)), args.queries))
+    queries = vectors[sorted(query_ids)]
+    corpus = np.asarray([v for i, v in enumerate(vectors) if i not in query_ids])
+    print(f"{len(corpus)} chunks, {len(queries)} queries, k={args.k}")
+    print(f"{'profile':<8} {'recall@k':>9} {'p50 ms':>8} {'p95 ms':>8} {'RAM MB':>8}")
+
+    for profile in COLLECTION_PROFILES:
+        name = f"bench_{profile.name}_{int(time.time())}"
+        provision_collection(client, name, profile=profile)
+        try:
+            for i in range(0, len(corpus), 256):
+                client.upsert(
+                    collection_name=name,
+                    points=[PointStruct(id=i + j, vector=v.tolist()) for j, v in enumerate(corpus[i:i + 256])],
+                    wait=True
+                )
+            wait_until_indexed(client, name)
+            params = search_params_for(client, name)
+
+            recalls, latencies = [], []
+            for query in queries:
+                exact = client.search(
+                    collection_name=name, query_vector=query.tolist(), limit=args.k,
+                    search_params=SearchParams(exact=True)
+                )
+                started = time.perf_counter()
+                approx = client.search(
+                    collection_name=name, query_vector=query.tolist(), limit=args.k, search_params=params
+                )
+                latencies.append((time.perf_counter() - started) * 1000)
+                expected = {point.id for point in exact}
+                recalls.append(len(expected & {point.id for point in approx}) / max(1, len(expected)))
+
+            print(
+                f"{profile.name:<8} {np.mean(recalls):>9.3f} {np.percentile(latencies, 50):>8.2f} "
+                f"{np.percentile(latencies, 95):>8.2f} {estimated_ram_mb(profile, len(corpus)):>8.1f}"
+            )
+        finally:
+            client.delete_collection(collection_name=name)
+            COLLECTION_REGISTRY.discard(name)
+            PROVISIONED_PROFILES.forget(name)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Compare embedding backends: parity with PyTorch and throughput.
+
+    python benchmark_embeddings.py [--backends onnx onnx-int8] [--texts 2000]
+
+Parity is measured on cosine scores: for query/passage pairs, the score
+from each backend is compared with the PyTorch score. Exits non-zero if a
+backend drifts more than --max-delta from PyTorch.
+"""
+import argparse
+import random
+import sys
+import time
+
+import numpy as np
+
+QUERIES = [
+    "What are your opening hours?",
+    "How do I reset my password?",
+    "Do you ship internationally?",
+    "Quels sont vos horaires d'ouverture ?",
+    "Can I get a refund after 30 days?",
+    "Where is my order?",
+    "How do I contact customer support?",
+    "Which payment methods do you accept?",
+]
+
+# Largest cosine score difference from PyTorch a backend may show
+MAX_COSINE_DELTA = 0.02
+
+WORDS = (
+    "order shipping refund account password delivery store hours support payment card invoice "
+    "product warranty return policy customer service website login email address days week "
+    "open closed holiday price discount subscription cancel update profile settings"
+).split()
+
+
+def sample_passages(count: int, seed: int = 0) -> list:
+    rng = random.Random(seed)
+    return [
+        " ".join(rng.choice(WORDS) for _ in range(rng.randint(20, 180))).capitalize() + "."
+        for _ in range(count)
+    ]
+
+
+def cosine_scores(queries: np.ndarray, passages: np.ndarray) -> np.ndarray:
+    queries = queries / np.linalg.norm(queries, axis=1, keepdims=True)
+    passages = passages / np.linalg.norm(passages, axis=1, keepdims=True)
+    return queries @ passages.T
+
+
+def throughput(model, texts: list) -> float:
+    model.embed_documents(texts[:32])  # warm-up
+    started = time.perf_counter()
+    model.embed_documents(texts)
+    return len(texts) / (time.perf_counter() - started)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", nargs="+", default=["onnx", "onnx-int8"])
+    parser.add_argument("--texts", type=int, default=2000, help="passages embedded for the throughput run")
+    parser.add_argument("--max-delta", type=float, default=MAX_COSINE_DELTA, help="largest allowed cosine score difference")
+    args = parser.parse_args()
+
+    # Imported here so --help works without loading a model
+    from embedding_models import build_embeddings
+
+    passages = sample_passages(args.texts)
+    parity_passages = passages[:200]
+
+    reference = build_embeddings("torch")
+    reference_scores = cosine_scores(
+        np.array([reference.embed_query(q) for q in QUERIES]),
+        np.array(reference.embed_documents(parity_passages))
+    )
+    print(f"torch       {throughput(reference, passages):8.1f} texts/sec")
+
+    failed = False
+    for backend in args.backends:
+        model = build_embeddings(backend)
+        scores = cosine_scores(
+            np.array([model.embed_query(q) for q in QUERIES]),
+            np.array(model.embed_documents(parity_passages))
+        )
+        delta = np.abs(scores - reference_scores)
+        # Same top-3 passages per query as PyTorch?
+        top_k_match = np.mean([
+            set(np.argsort(-scores[i])[:3]) == set(np.argsort(-reference_scores[i])[:3])
+            for i in range(len(QUERIES))
+        ])
+        rate = throughput(model, passages)
+        ok = delta.max() <= args.max_delta
+        failed |= not ok
+        print(
+            f"{backend:<11} {rate:8.1f} texts/sec  "
+            f"max |Δcos|={delta.max():.4f}  mean |Δcos|={delta.mean():.4f}  "
+            f"top-3 agreement={top_k_match:.0%}  {'OK' if ok else 'DRIFT'}"
+        )
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
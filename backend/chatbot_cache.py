@@ -0,0 +1,97 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+CHATBOT_CACHE_SIZE = int(os.getenv("CHATBOT_CACHE_SIZE", "1024"))
+CHATBOT_CACHE_TTL = float(os.getenv("CHATBOT_CACHE_TTL", "300"))
+
+
+@dataclass(frozen=True)
+class ChatbotConfig:
+    """The chatbot settings the chat endpoint actually needs."""
+    id: str
+    temperature: float
+    max_tokens: int
+    model: str
+    website_url: str
+    greeting_message: str
+
+    @classmethod
+    def from_row(cls, row: dict) -> "ChatbotConfig":
+        def value(key, default):
+            # Columns can exist and be NULL; 0 is still a valid temperature
+            return default if row.get(key) is None else row[key]
+
+        return cls(
+            id=str(row.get("id")),
+            temperature=value("temperature", 0.7),
+            max_tokens=value("max_tokens", 1000),
+            model=value("model", "mistralai/mistral-7b-instruct:free"),
+            website_url=value("website_url", ""),
+            greeting_message=value("greeting_message", "Bonjour ! Comment puis-je vous aider ? 😊"),
+        )
+
+
+class ChatbotConfigCache:
+    """Bounded LRU of ChatbotConfig entries that expire after `ttl` seconds.
+
+    update_chatbot and delete_chatbot invalidate entries explicitly; the TTL
+    only bounds staleness for edits made through another worker process.
+    """
+
+    def __init__(self, max_size: int = CHATBOT_CACHE_SIZE, ttl: float = CHATBOT_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, chatbot_id: str) -> Optional[ChatbotConfig]:
+        key = str(chatbot_id)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                config, expires_at = entry
+                if time.monotonic() < expires_at:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return config
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, config: ChatbotConfig):
+        with self._lock:
+            self._entries[config.id] = (config, time.monotonic() + self.ttl)
+            self._entries.move_to_end(config.id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, chatbot_id: str):
+        with self._lock:
+            self._entries.pop(str(chatbot_id), None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+CHATBOT_CONFIG_CACHE = ChatbotConfigCache()
@@ -0,0 +1,52 @@
+import threading
+
+from local_db import get_connection
+
+# Row bumped to invalidate every chatbot at once
+ALL_CHATBOTS = "*"
+
+
+class ChatbotGenerations:
+    """Per-chatbot generation counters shared by all worker processes.
+
+    A chatbot's generation is bumped whenever its documents or settings
+    change. In-process caches remember the generation their entries were
+    built at and drop them once it moved, so a change handled by one
+    uvicorn worker is seen by the others on their next lookup.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._conn = get_connection()
+        with self._lock, self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS chatbot_generations (
+                    chatbot_id TEXT PRIMARY KEY,
+                    generation INTEGER NOT NULL
+                )
+            """)
+
+    def get(self, chatbot_id: str) -> int:
+        """Current generation of a chatbot (it also moves with bump_all)."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT generation FROM chatbot_generations WHERE chatbot_id IN (?, ?)",
+                (str(chatbot_id), ALL_CHATBOTS)
+            ).fetchall()
+        return sum(row["generation"] for row in rows)
+
+    def bump(self, chatbot_id: str):
+        with self._lock, self._conn:
+            self._conn.execute(
+                """
+                INSERT INTO chatbot_generations (chatbot_id, generation) VALUES (?, 1)
+                ON CONFLICT(chatbot_id) DO UPDATE SET generation = generation + 1
+                """,
+                (str(chatbot_id),)
+            )
+
+    def bump_all(self):
+        self.bump(ALL_CHATBOTS)
+
+
+CHATBOT_GENERATIONS = ChatbotGenerations()
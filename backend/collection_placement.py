@@ -0,0 +1,191 @@
+import hashlib
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+from qdrant_client import QdrantClient
+from qdrant_client.models import (
+    FieldCondition,
+    Filter,
+    FilterSelector,
+    MatchValue,
+    PayloadSchemaType,
+    PointStruct,
+)
+
+from local_db import get_connection
+from vectorstore_setup import provision_collection, COLLECTION_REGISTRY
+
+# Where new chatbots are indexed: "dedicated" (one collection each) or "shared"
+COLLECTION_LAYOUT = os.getenv("COLLECTION_LAYOUT", "dedicated").lower()
+# Number of pooled collections small chatbots are spread over
+SHARED_COLLECTION_COUNT = int(os.getenv("SHARED_COLLECTION_COUNT", "4"))
+# A chatbot in a shared collection gets its own one past this many points
+SHARED_PROMOTION_POINTS = int(os.getenv("SHARED_PROMOTION_POINTS", "20000"))
+# Size a pooled collection is provisioned for (all its chatbots together)
+SHARED_COLLECTION_EXPECTED_POINTS = int(os.getenv("SHARED_COLLECTION_EXPECTED_POINTS", "100000"))
+
+TENANT_FIELD = "metadata.chatbot_id"
+
+
+@dataclass(frozen=True)
+class Placement:
+    """Where a chatbot's points live."""
+    chatbot_id: str
+    collection_name: str
+    shared: bool
+
+    def points_filter(self) -> Optional[Filter]:
+        """Filter selecting this chatbot's points; None for a dedicated collection."""
+        if not self.shared:
+            return None
+        return Filter(must=[FieldCondition(key=TENANT_FIELD, match=MatchValue(value=self.chatbot_id))])
+
+
+class CollectionPlacement:
+    """Registry of which collection holds each chatbot.
+
+    Dedicated chatbots own chatbot_{id} (an alias, see CollectionVersions).
+    Shared ones live in one of SHARED_COLLECTION_COUNT pooled collections,
+    tagged with metadata.chatbot_id (payload-indexed, so filtered search
+    stays fast). Chatbots indexed before the registry existed are dedicated.
+    """
+
+    def __init__(self, layout: str = COLLECTION_LAYOUT):
+        self.layout = layout
+        self._lock = threading.Lock()
+        self._conn = get_connection()
+        with self._lock, self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS chatbot_placements (
+                    chatbot_id TEXT PRIMARY KEY,
+                    collection_name TEXT NOT NULL,
+                    shared INTEGER NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+
+    @staticmethod
+    def dedicated_name(chatbot_id: str) -> str:
+        return f"chatbot_{chatbot_id}"
+
+    @staticmethod
+    def shared_name(chatbot_id: str) -> str:
+        bucket = int(hashlib.sha256(str(chatbot_id).encode("utf-8")).hexdigest(), 16) % SHARED_COLLECTION_COUNT
+        return f"shared_chatbots_{bucket}"
+
+    def _stored(self, chatbot_id: str) -> Optional[Placement]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT collection_name, shared FROM chatbot_placements WHERE chatbot_id = ?", (str(chatbot_id),)
+            ).fetchone()
+        if row is None:
+            return None
+        return Placement(str(chatbot_id), row["collection_name"], bool(row["shared"]))
+
+    def _store(self, placement: Placement):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO chatbot_placements (chatbot_id, collection_name, shared, updated_at) VALUES (?, ?, ?, ?)",
+                (placement.chatbot_id, placement.collection_name, int(placement.shared), time.time())
+            )
+
+    def resolve(self, client: QdrantClient, chatbot_id: str) -> Optional[Placement]:
+        """Placement of an indexed chatbot, or None if it has no documents yet."""
+        placement = self._stored(chatbot_id)
+        if placement is not None:
+            return placement
+        # Indexed before placements were recorded: always a dedicated collection
+        name = self.dedicated_name(chatbot_id)
+        if COLLECTION_REGISTRY.exists(client, name):
+            placement = Placement(str(chatbot_id), name, False)
+            self._store(placement)
+            return placement
+        return None
+
+    def assign(self, client: QdrantClient, chatbot_id: str) -> Placement:
+        """Placement for ingestion: the current one, or a new one per COLLECTION_LAYOUT."""
+        placement = self.resolve(client, chatbot_id)
+        if placement is None:
+            if self.layout == "shared":
+                placement = Placement(str(chatbot_id), self.shared_name(chatbot_id), True)
+            else:
+                placement = Placement(str(chatbot_id), self.dedicated_name(chatbot_id), False)
+            self._store(placement)
+        if placement.shared:
+            ensure_shared_collection(client, placement.collection_name)
+        return placement
+
+    def set_dedicated(self, chatbot_id: str) -> Placement:
+        placement = Placement(str(chatbot_id), self.dedicated_name(chatbot_id), False)
+        self._store(placement)
+        return placement
+
+    def forget(self, chatbot_id: str):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM chatbot_placements WHERE chatbot_id = ?", (str(chatbot_id),))
+
+    def count_points(self, client: QdrantClient, placement: Placement) -> int:
+        return client.count(
+            collection_name=placement.collection_name,
+            count_filter=placement.points_filter(),
+            exact=True
+        ).count
+
+    def delete_points(self, client: QdrantClient, placement: Placement):
+        """Remove a shared chatbot's points from its pooled collection."""
+        client.delete(
+            collection_name=placement.collection_name,
+            points_selector=FilterSelector(filter=placement.points_filter()),
+            wait=True
+        )
+
+    def copy_points(self, client: QdrantClient, placement: Placement, target: str, batch_size: int = 256) -> int:
+        """Copy a shared chatbot's points, vectors included, into `target`."""
+        copied = 0
+        offset = None
+        while True:
+            points, offset = client.scroll(
+                collection_name=placement.collection_name,
+                scroll_filter=placement.points_filter(),
+                limit=batch_size,
+                offset=offset,
+                with_payload=True,
+                with_vectors=True
+            )
+            if points:
+                client.upsert(
+                    collection_name=target,
+                    points=[PointStruct(id=p.id, vector=p.vector, payload=p.payload) for p in points],
+                    wait=True
+                )
+                copied += len(points)
+            if offset is None:
+                return copied
+
+
+def ensure_shared_collection(client: QdrantClient, collection_name: str):
+    """Create a pooled collection with the chatbot_id payload index it relies on."""
+    if COLLECTION_REGISTRY.exists(client, collection_name):
+        return
+    try:
+        # Sized for the pool as a whole, with one graph per chatbot_id
+        provision_collection(client, collection_name, SHARED_COLLECTION_EXPECTED_POINTS, shared=True)
+    except Exception:
+        # Another worker may have created it in the meantime
+        COLLECTION_REGISTRY.discard(collection_name)
+        if not COLLECTION_REGISTRY.exists(client, collection_name):
+            raise
+    # Has to exist before points come in for the per-tenant graphs to be built
+    client.create_payload_index(
+        collection_name=collection_name,
+        field_name=TENANT_FIELD,
+        field_schema=PayloadSchemaType.KEYWORD,
+        wait=True
+    )
+    print(f"🧺 Created shared collection {collection_name}")
+
+
+COLLECTION_PLACEMENT = CollectionPlacement()
@@ -0,0 +1,140 @@
+import os
+import threading
+import time
+from typing import Optional
+
+from qdrant_client import QdrantClient
+from qdrant_client.models import (
+    CreateAlias,
+    CreateAliasOperation,
+    DeleteAlias,
+    DeleteAliasOperation,
+)
+
+from local_db import get_connection
+from vectorstore_setup import get_qdrant_client, forget_search_params, COLLECTION_REGISTRY, PROVISIONED_PROFILES
+
+# How long a replaced collection is kept around before it is deleted
+COLLECTION_GC_GRACE_SECONDS = float(os.getenv("COLLECTION_GC_GRACE_SECONDS", "900"))
+COLLECTION_GC_INTERVAL = float(os.getenv("COLLECTION_GC_INTERVAL", "300"))
+
+
+class CollectionVersions:
+    """Blue/green versions of chatbot collections behind a Qdrant alias.
+
+    A rebuild writes into chatbot_{id}_v{n}; promote() then points the
+    chatbot_{id} alias at it in one atomic alias update, so reads never
+    see a missing or half-built collection. Replaced versions are retired
+    and deleted by the garbage collector after a grace period.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._conn = get_connection()
+        self._stop = threading.Event()
+        self._thread = None
+        with self._lock, self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS retired_collections (
+                    name TEXT PRIMARY KEY,
+                    retired_at REAL NOT NULL
+                )
+            """)
+
+    @staticmethod
+    def alias_name(chatbot_id: str) -> str:
+        return f"chatbot_{chatbot_id}"
+
+    @staticmethod
+    def new_version_name(chatbot_id: str) -> str:
+        return f"chatbot_{chatbot_id}_v{int(time.time() * 1000)}"
+
+    def alias_target(self, client: QdrantClient, alias: str) -> Optional[str]:
+        for item in client.get_aliases().aliases:
+            if item.alias_name == alias:
+                return item.collection_name
+        return None
+
+    def promote(self, client: QdrantClient, chatbot_id: str, collection_name: str):
+        """Atomically point the chatbot's alias at `collection_name`."""
+        alias = self.alias_name(chatbot_id)
+        previous = self.alias_target(client, alias)
+
+        if previous is None and COLLECTION_REGISTRY.exists(client, alias):
+            # Legacy layout: a real collection holds the alias name. It has to go
+            # before the alias can be created, which leaves a brief gap this once.
+            client.delete_collection(collection_name=alias)
+            PROVISIONED_PROFILES.forget(alias)
+
+        operations = []
+        if previous is not None:
+            operations.append(DeleteAliasOperation(delete_alias=DeleteAlias(alias_name=alias)))
+        operations.append(CreateAliasOperation(create_alias=CreateAlias(collection_name=collection_name, alias_name=alias)))
+        client.update_collection_aliases(change_aliases_operations=operations)
+        COLLECTION_REGISTRY.add(alias)
+        forget_search_params(alias)
+
+        if previous is not None and previous != collection_name:
+            self.retire(previous)
+        print(f"🔀 {alias} now serves {collection_name}")
+
+    def retire(self, collection_name: str):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO retired_collections (name, retired_at) VALUES (?, ?)",
+                (collection_name, time.time())
+            )
+
+    def drop_chatbot(self, client: QdrantClient, chatbot_id: str):
+        """Delete the alias, the collection behind it and every other version."""
+        alias = self.alias_name(chatbot_id)
+        target = self.alias_target(client, alias)
+        if target is not None:
+            client.update_collection_aliases(
+                change_aliases_operations=[DeleteAliasOperation(delete_alias=DeleteAlias(alias_name=alias))]
+            )
+        prefix = f"{alias}_v"
+        for collection in client.get_collections().collections:
+            if collection.name == alias or collection.name == target or collection.name.startswith(prefix):
+                client.delete_collection(collection_name=collection.name)
+                COLLECTION_REGISTRY.discard(collection.name)
+                PROVISIONED_PROFILES.forget(collection.name)
+        COLLECTION_REGISTRY.discard(alias)
+
+    def collect_garbage(self, client: QdrantClient, grace_seconds: float = COLLECTION_GC_GRACE_SECONDS):
+        cutoff = time.time() - grace_seconds
+        with self._lock:
+            names = [row["name"] for row in self._conn.execute(
+                "SELECT name FROM retired_collections WHERE retired_at < ?", (cutoff,)
+            )]
+        in_use = {item.collection_name for item in client.get_aliases().aliases}
+        for name in names:
+            try:
+                if name not in in_use:
+                    client.delete_collection(collection_name=name)
+                    COLLECTION_REGISTRY.discard(name)
+                    PROVISIONED_PROFILES.forget(name)
+                    print(f"🗑️ Garbage-collected old collection {name}")
+                with self._lock, self._conn:
+                    self._conn.execute("DELETE FROM retired_collections WHERE name = ?", (name,))
+            except Exception as e:
+                print(f"⚠️ Failed to garbage-collect {name}: {str(e)}")
+
+    def _gc_loop(self):
+        while not self._stop.wait(COLLECTION_GC_INTERVAL):
+            try:
+                self.collect_garbage(get_qdrant_client())
+            except Exception as e:
+                print(f"⚠️ Collection garbage collection failed: {str(e)}")
+
+    def start_gc(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._gc_loop, name="collection-gc", daemon=True)
+            self._thread.start()
+
+    def stop_gc(self):
+        self._stop.set()
+
+
+COLLECTION_VERSIONS = CollectionVersions()
@@ -0,0 +1,71 @@
+import json
+import threading
+import time
+from typing import Dict
+
+from local_db import get_connection
+
+
+class CrawlStateStore:
+    """What was last fetched from each page of a chatbot's website.
+
+    Kept per (chatbot, url): the ETag and Last-Modified validators for
+    conditional requests, a hash of the page text, and the page's links so
+    the crawl can go on past pages that answer 304 Not Modified.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._conn = get_connection()
+        with self._lock, self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS crawl_pages (
+                    chatbot_id TEXT NOT NULL,
+                    url TEXT NOT NULL,
+                    etag TEXT,
+                    last_modified TEXT,
+                    content_hash TEXT NOT NULL,
+                    links TEXT DEFAULT '[]',
+                    fetched_at REAL NOT NULL,
+                    PRIMARY KEY (chatbot_id, url)
+                )
+            """)
+
+    def load(self, chatbot_id: str) -> Dict[str, dict]:
+        """{url: {etag, last_modified, content_hash, links}} for a chatbot."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT url, etag, last_modified, content_hash, links FROM crawl_pages WHERE chatbot_id = ?",
+                (str(chatbot_id),)
+            ).fetchall()
+        return {
+            row["url"]: {
+                "etag": row["etag"],
+                "last_modified": row["last_modified"],
+                "content_hash": row["content_hash"],
+                "links": json.loads(row["links"] or "[]"),
+            }
+            for row in rows
+        }
+
+    def replace(self, chatbot_id: str, pages: Dict[str, dict]):
+        """Make `pages` the chatbot's crawl state; pages not in it are forgotten."""
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM crawl_pages WHERE chatbot_id = ?", (str(chatbot_id),))
+            self._conn.executemany(
+                "INSERT INTO crawl_pages (chatbot_id, url, etag, last_modified, content_hash, links, fetched_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (str(chatbot_id), url, page.get("etag"), page.get("last_modified"),
+                     page["content_hash"], json.dumps(page.get("links", [])), now)
+                    for url, page in pages.items()
+                ]
+            )
+
+    def drop_chatbot(self, chatbot_id: str):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM crawl_pages WHERE chatbot_id = ?", (str(chatbot_id),))
+
+
+CRAWL_STATE = CrawlStateStore()
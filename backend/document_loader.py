@@ -1,87 +1,256 @@
+import asyncio
 import os
-from langchain_community.document_loaders import PyPDFLoader
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pypdf import PdfReader
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from bs4 import BeautifulSoup
-import requests
-from urllib.parse import urljoin
 from langchain_core.documents import Document
 import xml.etree.ElementTree as ET
+from web_crawler import crawl_website, CRAWL_MAX_PAGES
 
 
-def load_and_split_xml(path):
-    documents = []
+def _xml_tag(elem) -> str:
+    # Drop the "{namespace}" prefix iterparse puts on qualified names
+    return elem.tag.split("}")[-1] if isinstance(elem.tag, str) else ""
 
-    try:
-        tree = ET.parse(path)
-        root = tree.getroot()
 
-        # Recursively collect text from all elements
-        for elem in root.iter():
-            text = elem.text.strip() if elem.text else ""
+def _common_xml_path(paths) -> str:
+    parts = [path.split("/") for path in paths]
+    common = []
+    for level in zip(*parts):
+        if any(part != level[0] for part in level):
+            break
+        common.append(level[0])
+    return "/".join(common) or "/"
+
+
+def iter_xml_chunks(path: str, chunk_size: int = 1000, chunk_overlap: int = 200):
+    """Stream an XML file into chunks sized like the PDF ones.
+
+    Elements are read with iterparse and removed once handled, so memory
+    stays flat on large feeds. Leaf text is grouped per parent element as
+    "tag: text" lines (one product, one record...), small groups are packed
+    together up to chunk_size, and anything larger is split with the PDF
+    splitter. Each chunk records the element path it comes from.
+    """
+    splitter = _pdf_splitter(chunk_size, chunk_overlap)
+    source = os.path.basename(path)
+    # One frame per open element: [path, lines, size]
+    stack = []
+    elements = []
+    pending, pending_paths, pending_size = [], [], 0
+
+    def emit(text, xml_path):
+        for piece in splitter.split_text(text):
+            yield Document(page_content=piece, metadata={"source": source, "xml_path": xml_path})
+
+    def flush_pending():
+        nonlocal pending, pending_paths, pending_size
+        if pending:
+            yield from emit("\n\n".join(pending), _common_xml_path(pending_paths))
+        pending, pending_paths, pending_size = [], [], 0
+
+    def add_group(xml_path, lines):
+        nonlocal pending_size
+        text = "\n".join(lines)
+        if pending and pending_size + len(text) > chunk_size:
+            yield from flush_pending()
+        pending.append(text)
+        pending_paths.append(xml_path)
+        pending_size += len(text) + 2
+        if pending_size >= chunk_size:
+            yield from flush_pending()
+
+    for event, elem in ET.iterparse(path, events=("start", "end")):
+        if event == "start":
+            parent_path = stack[-1][0] if stack else ""
+            stack.append([f"{parent_path}/{_xml_tag(elem)}", [], 0])
+            elements.append(elem)
+            continue
+
+        xml_path, lines, size = stack.pop()
+        elements.pop()
+        text = elem.text.strip() if elem.text else ""
+        if lines or len(elem):
+            # Container: its own text leads its group
             if text:
-                documents.append(Document(page_content=text))
+                lines.insert(0, text)
+            if lines:
+                yield from add_group(xml_path, lines)
+        elif text and stack:
+            parent = stack[-1]
+            parent[1].append(f"{_xml_tag(elem)}: {text}")
+            parent[2] += len(text)
+            # A very flat element (thousands of fields) is emitted in pieces
+            if parent[2] >= chunk_size:
+                yield from add_group(parent[0], parent[1])
+                parent[1], parent[2] = [], 0
+        elif text:
+            yield from add_group(xml_path, [text])
+
+        # Free what was handled; the parent keeps no reference to it
+        elem.clear()
+        if elements:
+            elements[-1].remove(elem)
+
+    yield from flush_pending()
+
+
+def load_and_split_xml(path, chunk_size: int = 1000, chunk_overlap: int = 200):
+    documents = []
+
+    try:
+        for chunk in iter_xml_chunks(path, chunk_size, chunk_overlap):
+            documents.append(chunk)
     except Exception as e:
         print(f"⚠️ Error parsing XML: {str(e)}")
 
     return documents
 
-def load_and_split_pdf(file_path: str, chunk_size: int = 1000, chunk_overlap: int = 200):
-    try:
-        print(f"📄 Loading PDF: {file_path}")
-        loader = PyPDFLoader(file_path)
-        documents = loader.load()
-        print(f"✅ Loaded {len(documents)} pages")
-
-        splitter = RecursiveCharacterTextSplitter(
-            chunk_size=chunk_size,
-            chunk_overlap=chunk_overlap,
-            length_function=len,
-            separators=["\n\n", "\n", " ", ""]
+def _pdf_splitter(chunk_size: int, chunk_overlap: int) -> RecursiveCharacterTextSplitter:
+    return RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        length_function=len,
+        separators=["\n\n", "\n", " ", ""]
+    )
+
+
+def iter_pdf_pages(file_path: str, start: int = 0, end: int = None):
+    """Yield the pages of a PDF one Document at a time, without loading them all."""
+    reader = PdfReader(file_path)
+    source = os.path.basename(file_path)
+    page_count = len(reader.pages)
+    for page_number in range(start, page_count if end is None else min(end, page_count)):
+        yield Document(
+            page_content=reader.pages[page_number].extract_text() or "",
+            metadata={"source": source, "page": page_number}
         )
 
-        chunks = splitter.split_documents(documents)
-        print(f"✂️ Split into {len(chunks)} chunks")
 
-        for doc in chunks:
-            doc.metadata["source"] = os.path.basename(file_path)
+def iter_pdf_chunks(file_path: str, chunk_size: int = 1000, chunk_overlap: int = 200, start: int = 0, end: int = None):
+    """Split a PDF page by page; only one page is held in memory at a time."""
+    splitter = _pdf_splitter(chunk_size, chunk_overlap)
+    for page in iter_pdf_pages(file_path, start, end):
+        yield from splitter.split_documents([page])
+
 
+def load_and_split_pdf(file_path: str, chunk_size: int = 1000, chunk_overlap: int = 200):
+    try:
+        print(f"📄 Loading PDF: {file_path}")
+        chunks = list(iter_pdf_chunks(file_path, chunk_size, chunk_overlap))
+        print(f"✂️ Split into {len(chunks)} chunks")
         return chunks
 
     except Exception as e:
         print(f"❌ Error loading PDF: {str(e)}")
         raise RuntimeError(f"Failed to load and split PDF: {e}")
 
-def scrape_website(base_url: str, limit_pages: int = 10):
-    visited = set()
-    to_visit = [base_url]
-    pages_scraped = 0
-    chunks = []
+PARSE_WORKERS = int(os.getenv("PARSE_WORKERS", str(os.cpu_count() or 2)))
+# Big PDFs are cut into page ranges of this size and parsed in parallel
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "40"))
+# Parsed pieces waiting to be embedded, at most; bounds memory on huge documents
+PARSE_MAX_IN_FLIGHT = int(os.getenv("PARSE_MAX_IN_FLIGHT", str(PARSE_WORKERS * 2)))
+
+_parse_pool = None
+
+
+def _get_parse_pool() -> ProcessPoolExecutor:
+    global _parse_pool
+    if _parse_pool is None:
+        # spawn: forking a process that runs threads (uvicorn, health checks) is unsafe
+        _parse_pool = ProcessPoolExecutor(max_workers=PARSE_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _parse_pool
+
+
+def _pdf_page_count(file_path: str) -> int:
+    return len(PdfReader(file_path).pages)
+
+
+def split_pdf_pages(file_path: str, start: int, end: int, chunk_size: int = 1000, chunk_overlap: int = 200):
+    """Parse and split pages [start, end) of a PDF, same output as load_and_split_pdf."""
+    return list(iter_pdf_chunks(file_path, chunk_size, chunk_overlap, start, end))
+
+
+def _parse_task(path: str, start: int, end: int, chunk_size: int, chunk_overlap: int):
+    return split_pdf_pages(path, start, end, chunk_size, chunk_overlap)
+
 
-    while to_visit and pages_scraped < limit_pages:
-        url = to_visit.pop(0)
-        if url in visited:
+def _iter_xml_batches(path: str, chunk_size: int, chunk_overlap: int, batch_size: int):
+    """Stream an XML file as (path, chunks, file_done, error) pieces of batch_size chunks."""
+    batch = []
+    try:
+        for chunk in iter_xml_chunks(path, chunk_size, chunk_overlap):
+            if len(batch) == batch_size:
+                yield path, batch, False, None
+                batch = []
+            batch.append(chunk)
+    except Exception as e:
+        yield path, [], True, f"Failed to load and split {path}: {e}"
+        return
+    yield path, batch, True, None
+
+
+def parse_files_parallel(paths, chunk_size: int = 1000, chunk_overlap: int = 200, xml_batch_size: int = 256):
+    """Parse and split several files on a process pool.
+
+    PDFs are cut into page ranges of PDF_PAGES_PER_TASK so one big file also
+    uses every core. Yields (path, chunks, file_done, error) as each piece
+    finishes; file_done is True on the last piece of a file. A failed piece
+    comes with no chunks and an error message and does not stop the others.
+
+    XML files are streamed in the calling thread instead, xml_batch_size
+    chunks at a time, while the pool works on the PDFs: a single XML piece
+    would otherwise hold (and pickle) the whole file.
+    """
+    remaining = {}
+    xml_paths = []
+    # Tasks are submitted lazily: a piece is only parsed once there is room
+    # for it, so a slow embedder holds back parsing instead of piling up chunks
+    tasks = []
+    for path in paths:
+        ext = os.path.splitext(path)[1].lower()
+        if ext == ".pdf":
+            try:
+                page_count = _pdf_page_count(path)
+            except Exception as e:
+                yield path, [], True, f"Failed to load and split {path}: {e}"
+                continue
+            ranges = [(start, start + PDF_PAGES_PER_TASK) for start in range(0, page_count, PDF_PAGES_PER_TASK)] or [(0, 0)]
+        elif ext == ".xml":
+            xml_paths.append(path)
             continue
-        visited.add(url)
+        else:
+            print(f"⚠️ Skipping unsupported file: {path}")
+            yield path, [], True, None
+            continue
+        remaining[path] = len(ranges)
+        tasks.extend((path, start, end) for start, end in ranges)
+
+    tasks.reverse()
+    pool = _get_parse_pool() if tasks else None
+    futures = {}
+
+    def submit_tasks():
+        while tasks and len(futures) < PARSE_MAX_IN_FLIGHT:
+            path, start, end = tasks.pop()
+            futures[pool.submit(_parse_task, path, start, end, chunk_size, chunk_overlap)] = path
 
+    submit_tasks()
+    for path in xml_paths:
+        yield from _iter_xml_batches(path, chunk_size, chunk_overlap, xml_batch_size)
+
+    while tasks or futures:
+        submit_tasks()
+        future = next(as_completed(futures))
+        path = futures.pop(future)
+        remaining[path] -= 1
         try:
-            res = requests.get(url, timeout=5)
-            soup = BeautifulSoup(res.text, 'html.parser')
-
-            # Add internal links
-            for link in soup.find_all('a', href=True):
-                full_url = urljoin(base_url, link['href'])
-                if base_url in full_url and full_url not in visited:
-                    to_visit.append(full_url)
-
-            # Extract visible text
-            text = soup.get_text(separator=' ', strip=True)
-            chunks.append(Document(
-                page_content=text[:1000],
-                metadata={"source": "web", "url": url}
-            ))
-            pages_scraped += 1
-
-        except Exception:
-            continue
+            yield path, future.result(), remaining[path] == 0, None
+        except Exception as e:
+            yield path, [], remaining[path] == 0, f"Failed to load and split {path}: {e}"
+
 
-    return chunks
\ No newline at end of file
+def scrape_website(base_url: str, limit_pages: int = CRAWL_MAX_PAGES):
+    """Crawl a site and return its pages as chunks; see web_crawler.WebsiteCrawler."""
+    return asyncio.run(crawl_website(base_url, limit_pages))
@@ -0,0 +1,216 @@
+import glob
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+from local_db import get_connection
+
+UPLOAD_DIR = "uploaded_pdfs"
+# Parsed chunks and their vectors, one pair of files per document hash
+CHUNK_CACHE_DIR = os.path.join(UPLOAD_DIR, ".chunks")
+
+
+def is_upload_path(path: str) -> bool:
+    """Whether `path` is a file inside UPLOAD_DIR (symlinks and ".." resolved)."""
+    if not isinstance(path, str) or not path:
+        return False
+    upload_dir = os.path.realpath(UPLOAD_DIR)
+    return os.path.realpath(path).startswith(upload_dir + os.sep)
+
+
+class DocumentStore:
+    """Content-addressed store for uploaded documents.
+
+    Each distinct file (by SHA-256) is written once, whatever its name and
+    however many chatbots use it. References are counted per chatbot, and
+    the file and its cached chunks are removed with the last reference.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._conn = get_connection()
+        with self._lock, self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS documents (
+                    sha256 TEXT PRIMARY KEY,
+                    path TEXT NOT NULL UNIQUE,
+                    filename TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at TEXT NOT NULL
+                )
+            """)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS document_refs (
+                    chatbot_id TEXT NOT NULL,
+                    sha256 TEXT NOT NULL,
+                    PRIMARY KEY (chatbot_id, sha256)
+                )
+            """)
+            # Documents whose ingestion into a chatbot's index completed, with their point count
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS indexed_documents (
+                    chatbot_id TEXT NOT NULL,
+                    document_id TEXT NOT NULL,
+                    points INTEGER NOT NULL,
+                    PRIMARY KEY (chatbot_id, document_id)
+                )
+            """)
+
+    def save(self, data: bytes, filename: str, chatbot_id: str) -> Tuple[str, str]:
+        """Store an upload for a chatbot and return (sha256, path); identical content is stored once.
+
+        The chatbot's reference is added under the same lock, so a concurrent
+        release() by another chatbot cannot delete the file in between.
+        """
+        sha256 = hashlib.sha256(data).hexdigest()
+        with self._lock:
+            row = self._conn.execute("SELECT path FROM documents WHERE sha256 = ?", (sha256,)).fetchone()
+            if row is not None and os.path.exists(row["path"]):
+                self._add_ref_locked(chatbot_id, sha256)
+                return sha256, row["path"]
+
+            os.makedirs(UPLOAD_DIR, exist_ok=True)
+            path = os.path.join(UPLOAD_DIR, f"{sha256}_{os.path.basename(filename)}")
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+            with self._conn:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO documents (sha256, path, filename, size, created_at) VALUES (?, ?, ?, ?, ?)",
+                    (sha256, path, filename, len(data), datetime.utcnow().isoformat())
+                )
+            self._add_ref_locked(chatbot_id, sha256)
+        return sha256, path
+
+    def hash_for_path(self, path: str) -> Optional[str]:
+        """SHA-256 of a stored document, None for files saved before the store existed."""
+        with self._lock:
+            row = self._conn.execute("SELECT sha256 FROM documents WHERE path = ?", (path,)).fetchone()
+        return row["sha256"] if row else None
+
+    def _add_ref_locked(self, chatbot_id: str, sha256: str):
+        with self._conn:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO document_refs (chatbot_id, sha256) VALUES (?, ?)",
+                (str(chatbot_id), sha256)
+            )
+
+    def add_ref(self, chatbot_id: str, sha256: str):
+        with self._lock:
+            self._add_ref_locked(chatbot_id, sha256)
+
+    def move_refs(self, from_id: str, to_id: str):
+        """Hand all references of `from_id` (e.g. a chatbot being created) over to `to_id`."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO document_refs (chatbot_id, sha256) SELECT ?, sha256 FROM document_refs WHERE chatbot_id = ?",
+                (str(to_id), str(from_id))
+            )
+            self._conn.execute("DELETE FROM document_refs WHERE chatbot_id = ?", (str(from_id),))
+
+    def ref_count(self, sha256: str) -> int:
+        with self._lock:
+            row = self._conn.execute("SELECT COUNT(*) AS n FROM document_refs WHERE sha256 = ?", (sha256,)).fetchone()
+        return row["n"]
+
+    def release(self, chatbot_id: str, path: str) -> bool:
+        """Drop a chatbot's reference to a file; delete it once nobody uses it.
+
+        Returns True when the file was removed from disk. Paths outside
+        UPLOAD_DIR are never touched.
+        """
+        if not is_upload_path(path):
+            print(f"⚠️ Not releasing {path}: outside {UPLOAD_DIR}")
+            return False
+        sha256 = self.hash_for_path(path)
+        if sha256 is None:
+            # Legacy per-upload file, owned by this chatbot alone
+            if os.path.exists(path):
+                os.remove(path)
+                return True
+            return False
+
+        with self._lock, self._conn:
+            self._conn.execute(
+                "DELETE FROM document_refs WHERE chatbot_id = ? AND sha256 = ?",
+                (str(chatbot_id), sha256)
+            )
+            remaining = self._conn.execute(
+                "SELECT COUNT(*) AS n FROM document_refs WHERE sha256 = ?", (sha256,)
+            ).fetchone()["n"]
+            if remaining:
+                return False
+            self._conn.execute("DELETE FROM documents WHERE sha256 = ?", (sha256,))
+
+        for file_path in (path, *self._all_chunk_cache_paths(sha256)):
+            if os.path.exists(file_path):
+                os.remove(file_path)
+        return True
+
+    def mark_indexed(self, chatbot_id: str, document_id: str, points: int):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO indexed_documents (chatbot_id, document_id, points) VALUES (?, ?, ?)",
+                (str(chatbot_id), document_id, points)
+            )
+
+    def indexed_points(self, chatbot_id: str, document_id: str) -> Optional[int]:
+        """Points a document had when its last ingestion completed, None if it never did."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT points FROM indexed_documents WHERE chatbot_id = ? AND document_id = ?",
+                (str(chatbot_id), document_id)
+            ).fetchone()
+        return row["points"] if row else None
+
+    def forget_indexed(self, chatbot_id: str):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM indexed_documents WHERE chatbot_id = ?", (str(chatbot_id),))
+
+    def _chunk_cache_paths(self, sha256: str, variant: str) -> Tuple[str, str]:
+        # One cache entry per embedding model and splitter setting (`variant`)
+        suffix = hashlib.sha256(variant.encode("utf-8")).hexdigest()[:16]
+        return (
+            os.path.join(CHUNK_CACHE_DIR, f"{sha256}.{suffix}.json"),
+            os.path.join(CHUNK_CACHE_DIR, f"{sha256}.{suffix}.npy"),
+        )
+
+    def _all_chunk_cache_paths(self, sha256: str) -> List[str]:
+        """Cache files of a document for every variant (and the older unkeyed ones)."""
+        return glob.glob(os.path.join(glob.escape(CHUNK_CACHE_DIR), f"{sha256}.*"))
+
+    def load_chunks(self, sha256: str, variant: str) -> Optional[Tuple[List[Document], np.ndarray]]:
+        """Cached (chunks, vectors) of a document, or None if it was never embedded this way."""
+        chunks_path, vectors_path = self._chunk_cache_paths(sha256, variant)
+        if not (os.path.exists(chunks_path) and os.path.exists(vectors_path)):
+            return None
+        try:
+            with open(chunks_path, "r", encoding="utf-8") as f:
+                chunks = [Document(page_content=c["page_content"], metadata=c["metadata"]) for c in json.load(f)]
+            vectors = np.load(vectors_path)
+        except Exception as e:
+            print(f"⚠️ Ignoring unreadable chunk cache for {sha256}: {str(e)}")
+            return None
+        if len(chunks) != len(vectors):
+            return None
+        return chunks, vectors
+
+    def save_chunks(self, sha256: str, variant: str, chunks: List[Document], vectors):
+        os.makedirs(CHUNK_CACHE_DIR, exist_ok=True)
+        chunks_path, vectors_path = self._chunk_cache_paths(sha256, variant)
+        with open(f"{chunks_path}.tmp", "w", encoding="utf-8") as f:
+            json.dump([{"page_content": c.page_content, "metadata": c.metadata} for c in chunks], f, ensure_ascii=False)
+        with open(f"{vectors_path}.tmp", "wb") as f:
+            np.save(f, np.asarray(vectors, dtype=np.float32))
+        os.replace(f"{vectors_path}.tmp", vectors_path)
+        os.replace(f"{chunks_path}.tmp", chunks_path)
+
+
+DOCUMENT_STORE = DocumentStore()
@@ -1,7 +1,9 @@
 from fastapi import APIRouter, Request
 from fastapi.responses import HTMLResponse
-from vectorstore_setup import get_qdrant_client
-from rag_router import query_agent  # ✅ Use your existing RAG logic
+from vectorstore_setup import get_qdrant_client, get_async_qdrant_client
+from fastapi.concurrency import run_in_threadpool
+from rag_router import aquery_agent  # ✅ Use your existing RAG logic
+from collection_placement import COLLECTION_PLACEMENT
 
 router = APIRouter()
 
@@ -29,8 +31,14 @@ async def handle_chatbot_query(chatbot_id: int, request: Request):
 
     # RAG logic
     qdrant = get_qdrant_client()
-    collection_name = f"chatbot_{chatbot_id}"
-    answer, docs = query_agent(qdrant, collection_name, user_message)
+    placement = await run_in_threadpool(COLLECTION_PLACEMENT.resolve, qdrant, str(chatbot_id))
+    if placement is None:
+        answer = "No matching documents found."
+    else:
+        answer, docs = await aquery_agent(
+            qdrant, get_async_qdrant_client(), placement.collection_name, user_message,
+            search_filter=placement.points_filter()
+        )
 
     return f"""
     <html>
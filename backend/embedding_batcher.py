@@ -0,0 +1,110 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, List, Optional
+
+from langchain_core.embeddings import Embeddings
+
+EMBED_BATCHING_ENABLED = os.getenv("EMBED_BATCHING_ENABLED", "true").lower() in ("1", "true", "yes")
+# Queries per forward pass, at most
+EMBED_BATCH_MAX_SIZE = int(os.getenv("EMBED_BATCH_MAX_SIZE", "32"))
+# How long the first query of a batch waits for others to join
+EMBED_BATCH_MAX_WAIT_MS = float(os.getenv("EMBED_BATCH_MAX_WAIT_MS", "3"))
+# Queries waiting at most; callers block beyond that
+EMBED_BATCH_MAX_QUEUE = int(os.getenv("EMBED_BATCH_MAX_QUEUE", "1024"))
+
+
+class QueryBatcher(Embeddings):
+    """Runs concurrent embed_query calls as one batched forward pass.
+
+    Each caller (a thread-pool thread of a chat request) queues its text
+    and waits on a Future. A single worker thread takes the first waiting
+    query, lets others join for up to EMBED_BATCH_MAX_WAIT_MS or until
+    EMBED_BATCH_MAX_SIZE, encodes them together and hands each vector back.
+    Queries are encoded with `encode` (embed_documents by default, the same
+    encoding for symmetric models such as MiniLM). Document batches pass
+    through.
+    """
+
+    def __init__(self, base: Embeddings, max_size: int = EMBED_BATCH_MAX_SIZE,
+                 max_wait_ms: float = EMBED_BATCH_MAX_WAIT_MS, max_queue: int = EMBED_BATCH_MAX_QUEUE,
+                 encode: Optional[Callable[[List[str]], List[List[float]]]] = None):
+        self.base = base
+        self.encode = encode or base.embed_documents
+        self.max_size = max_size
+        self.max_wait = max_wait_ms / 1000
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._thread = None
+        self.batches = 0
+        self.queries = 0
+        self.largest_batch = 0
+        self.total_wait = 0.0
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            batch = [first]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            started = time.monotonic()
+            try:
+                vectors = self.encode([text for text, _, _ in batch])
+            except Exception as e:
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future, _), vector in zip(batch, vectors):
+                future.set_result(vector)
+
+            with self._lock:
+                self.batches += 1
+                self.queries += len(batch)
+                self.largest_batch = max(self.largest_batch, len(batch))
+                self.total_wait += sum(started - queued_at for _, _, queued_at in batch)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.base.embed_documents(texts)
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """Several queries, batched together with whatever else is waiting."""
+        self._ensure_worker()
+        futures = []
+        for text in texts:
+            future = Future()
+            self._queue.put((text, future, time.monotonic()))
+            futures.append(future)
+        return [future.result() for future in futures]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_queries([text])[0]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "queue_depth": self._queue.qsize(),
+                "max_queue": self._queue.maxsize,
+                "max_batch_size": self.max_size,
+                "max_wait_ms": self.max_wait * 1000,
+                "batches": self.batches,
+                "queries": self.queries,
+                "largest_batch": self.largest_batch,
+                "avg_batch_size": self.queries / self.batches if self.batches else 0.0,
+                "avg_wait_ms": self.total_wait * 1000 / self.queries if self.queries else 0.0,
+            }
@@ -0,0 +1,257 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import List
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+EMBEDDING_CACHE_DIR = os.getenv(
+    "EMBEDDING_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "embedding_cache")
+)
+EMBEDDING_CACHE_MAX_MB = float(os.getenv("EMBEDDING_CACHE_MAX_MB", "512"))
+# A hit only rewrites an entry's last_used when it is older than this; eviction is LRU to this precision
+EMBEDDING_CACHE_TOUCH_SECONDS = float(os.getenv("EMBEDDING_CACHE_TOUCH_SECONDS", "600"))
+# Query vectors kept in memory by QueryEmbeddingLRU
+QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", "4096"))
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """Canonical form used for cache keys: NFC, trimmed, single spaces."""
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFC", text)).strip()
+
+
+def text_key(text: str) -> str:
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+class EmbeddingCacheStore:
+    """Vectors of one model in a memory-mapped float32 file, indexed in SQLite.
+
+    The file holds a fixed number of slots sized from EMBEDDING_CACHE_MAX_MB.
+    Once every slot is used, the least recently used entries give up theirs.
+    Slot allocation runs in an IMMEDIATE transaction, so several worker
+    processes can share the same cache directory. Vectors are written to
+    the shared mapping and left to the OS to write back; nothing is synced
+    per write.
+    """
+
+    def __init__(self, model_name: str, dim: int, max_mb: float = EMBEDDING_CACHE_MAX_MB, cache_dir: str = EMBEDDING_CACHE_DIR):
+        self.model_name = model_name
+        self.dim = dim
+        self.capacity = max(1, int(max_mb * 1024 * 1024 // (dim * 4)))
+        os.makedirs(cache_dir, exist_ok=True)
+        slug = re.sub(r"[^A-Za-z0-9_.-]", "_", model_name)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(cache_dir, f"{slug}.sqlite"), timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        with self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS entries (
+                    key TEXT PRIMARY KEY,
+                    slot INTEGER NOT NULL UNIQUE,
+                    last_used REAL NOT NULL
+                )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used)")
+
+        vectors_path = os.path.join(cache_dir, f"{slug}.f32")
+        expected_size = self.capacity * dim * 4
+        if os.path.exists(vectors_path) and os.path.getsize(vectors_path) == expected_size:
+            self._vectors = np.memmap(vectors_path, dtype=np.float32, mode="r+", shape=(self.capacity, dim))
+        else:
+            # New cache, or the size limit changed: start over
+            with self._conn:
+                self._conn.execute("DELETE FROM entries")
+            self._vectors = np.memmap(vectors_path, dtype=np.float32, mode="w+", shape=(self.capacity, dim))
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def get_many(self, keys: List[str]) -> dict:
+        """Return {key: vector} for the keys present in the cache."""
+        found = {}
+        # Entries used recently enough are not written to on every hit
+        stale = []
+        now = time.time()
+        stale_before = now - EMBEDDING_CACHE_TOUCH_SECONDS
+        with self._lock:
+            for i in range(0, len(keys), 500):
+                part = keys[i:i + 500]
+                placeholders = ",".join("?" * len(part))
+                for key, slot, last_used in self._conn.execute(
+                    f"SELECT key, slot, last_used FROM entries WHERE key IN ({placeholders})", part
+                ):
+                    found[key] = np.array(self._vectors[slot])
+                    if last_used < stale_before:
+                        stale.append(key)
+            if stale:
+                with self._conn:
+                    self._conn.executemany(
+                        "UPDATE entries SET last_used = ? WHERE key = ?",
+                        [(now, key) for key in stale]
+                    )
+        return found
+
+    def put_many(self, items: dict):
+        """Store {key: vector}, evicting least recently used entries when full."""
+        if not items:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                placeholders = ",".join("?" * len(items))
+                known = {
+                    key for (key,) in self._conn.execute(
+                        f"SELECT key FROM entries WHERE key IN ({placeholders})", list(items)
+                    )
+                }
+                new_keys = [key for key in items if key not in known][:self.capacity]
+
+                used = self._conn.execute("SELECT COUNT(*), COALESCE(MAX(slot), -1) FROM entries").fetchone()
+                free_slots = list(range(used[1] + 1, min(self.capacity, used[1] + 1 + len(new_keys))))
+                missing = len(new_keys) - len(free_slots)
+                if missing > 0:
+                    victims = self._conn.execute(
+                        "SELECT key, slot FROM entries ORDER BY last_used LIMIT ?", (missing,)
+                    ).fetchall()
+                    self._conn.executemany("DELETE FROM entries WHERE key = ?", [(key,) for key, _ in victims])
+                    free_slots.extend(slot for _, slot in victims)
+                    self.evictions += len(victims)
+
+                rows = []
+                for key, slot in zip(new_keys, free_slots):
+                    self._vectors[slot] = np.asarray(items[key], dtype=np.float32)
+                    rows.append((key, slot, now))
+                self._conn.executemany("INSERT INTO entries (key, slot, last_used) VALUES (?, ?, ?)", rows)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings wrapper that serves repeated documents from an EmbeddingCacheStore.
+
+    Keys are (model name, kind, normalized text) so query and document
+    encodings stay separate for models that treat them differently.
+    Queries pass straight through: they are cached in memory by
+    QueryEmbeddingLRU, and a chat request should not wait on SQLite.
+    """
+
+    def __init__(self, base: Embeddings, model_name: str, dim: int, max_mb: float = EMBEDDING_CACHE_MAX_MB,
+                 cache_dir: str = EMBEDDING_CACHE_DIR):
+        self.base = base
+        self.model_name = model_name
+        self.store = EmbeddingCacheStore(model_name, dim, max_mb, cache_dir)
+        self.hits = 0
+        self.misses = 0
+
+    def _embed(self, texts: List[str], kind: str, compute) -> List[List[float]]:
+        keys = [text_key(f"{kind}:{text}") for text in texts]
+        try:
+            cached = self.store.get_many(keys)
+        except Exception as e:
+            print(f"⚠️ Embedding cache read failed: {str(e)}")
+            cached = {}
+
+        # Compute each distinct missing text once
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+        self.hits += len(texts) - sum(1 for key in keys if key not in cached)
+        self.misses += sum(1 for key in keys if key not in cached)
+
+        if missing:
+            computed = compute(list(missing.values()))
+            fresh = dict(zip(missing.keys(), computed))
+            try:
+                self.store.put_many(fresh)
+            except Exception as e:
+                print(f"⚠️ Embedding cache write failed: {str(e)}")
+            cached.update({key: np.asarray(vector, dtype=np.float32) for key, vector in fresh.items()})
+
+        return [cached[key].tolist() for key in keys]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._embed(texts, "doc", self.base.embed_documents)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.base.embed_query(text)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "model": self.model_name,
+            "entries": len(self.store),
+            "capacity": self.store.capacity,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.store.evictions,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+class QueryEmbeddingLRU(Embeddings):
+    """In-process LRU of query vectors, keyed on (model name, normalized text).
+
+    Sits in front of every other layer so a repeated question costs a dict
+    lookup, not a forward pass. It is the only cache for queries; document
+    embeddings pass straight through.
+    """
+
+    def __init__(self, base: Embeddings, model_name: str, max_size: int = QUERY_EMBEDDING_CACHE_SIZE):
+        self.base = base
+        self.model_name = model_name
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.base.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        key = (self.model_name, normalize_text(text))
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return list(vector)
+            self.misses += 1
+
+        vector = self.base.embed_query(text)
+        with self._lock:
+            self._entries[key] = tuple(vector)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return vector
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "model": self.model_name,
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
@@ -0,0 +1,39 @@
+import os
+
+from dotenv import load_dotenv
+from langchain_community.embeddings import HuggingFaceEmbeddings
+
+# Model settings and construction only: importing this module loads nothing,
+# so the embedding server can use it without the workers' caches and clients
+load_dotenv()
+
+EMBEDDING_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+
+# Set embedding dimensions based on model
+COLLECTION_DIMENSIONS = 384  # for MiniLM-L6
+
+# Sentences per forward pass; MiniLM on CPU is fastest well above the default of 32
+EMBEDDING_ENCODE_BATCH_SIZE = int(os.getenv("EMBEDDING_ENCODE_BATCH_SIZE", "64"))
+# torch (sentence-transformers), onnx, or onnx-int8 (dynamic int8 quantization)
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch").lower()
+
+
+def build_embeddings(backend: str = EMBEDDING_BACKEND):
+    """The bare embedding model for a backend, without any cache in front."""
+    if backend in ("onnx", "onnx-int8"):
+        from onnx_embeddings import OnnxEmbeddings
+        return OnnxEmbeddings(
+            EMBEDDING_MODEL_NAME,
+            quantize=backend == "onnx-int8",
+            batch_size=EMBEDDING_ENCODE_BATCH_SIZE
+        )
+    if backend != "torch":
+        raise ValueError(f"Unknown EMBEDDING_BACKEND: {backend}")
+    return HuggingFaceEmbeddings(
+        model_name=EMBEDDING_MODEL_NAME,
+        encode_kwargs={"batch_size": EMBEDDING_ENCODE_BATCH_SIZE}
+    )
+
+
+# Cache keys: vectors from another backend are close but not identical
+EMBEDDING_CACHE_MODEL = EMBEDDING_MODEL_NAME if EMBEDDING_BACKEND == "torch" else f"{EMBEDDING_MODEL_NAME}@{EMBEDDING_BACKEND}"
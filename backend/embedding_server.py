@@ -0,0 +1,74 @@
+"""Shared embedding server: one model for all uvicorn workers on a host.
+
+    EMBEDDING_SERVICE_URL=unix:///run/embeddings.sock python embedding_server.py
+
+Listens on the Unix socket or host:port of EMBEDDING_SERVICE_URL and uses
+the same EMBEDDING_BACKEND as the workers. Workers started with the same
+EMBEDDING_SERVICE_URL send their texts here instead of loading the model;
+questions from all of them are micro-batched together.
+"""
+import os
+from typing import List
+from urllib.parse import urlparse
+
+import httpx
+import uvicorn
+from fastapi import FastAPI
+from pydantic import BaseModel
+
+from embedding_batcher import QueryBatcher
+from embedding_models import COLLECTION_DIMENSIONS, EMBEDDING_CACHE_MODEL, build_embeddings
+from embedding_service import EMBEDDING_SERVICE_URL, service_client
+
+app = FastAPI(title="Embedding service")
+
+MODEL = build_embeddings()
+BATCHER = QueryBatcher(MODEL)
+
+
+class EmbedRequest(BaseModel):
+    texts: List[str]
+
+
+# Plain (sync) endpoints: they run in the thread pool, so concurrent
+# questions meet in the batcher
+@app.post("/embed/queries")
+def embed_queries(request: EmbedRequest):
+    return {"vectors": BATCHER.embed_queries(request.texts)}
+
+
+@app.post("/embed/documents")
+def embed_documents(request: EmbedRequest):
+    return {"vectors": MODEL.embed_documents(request.texts)}
+
+
+@app.get("/health")
+def health():
+    return {"model": EMBEDDING_CACHE_MODEL, "dim": COLLECTION_DIMENSIONS, "batcher": BATCHER.stats()}
+
+
+def server_running(url: str) -> bool:
+    try:
+        with service_client(url, timeout=2) as client:
+            return client.get("/health").status_code == 200
+    except httpx.HTTPError:
+        return False
+
+
+def main():
+    url = EMBEDDING_SERVICE_URL or "http://127.0.0.1:8100"
+    if url.startswith("unix://"):
+        path = url[len("unix://"):]
+        if os.path.exists(path):
+            if server_running(url):
+                raise SystemExit(f"An embedding server is already listening on {path}")
+            # Left behind by a previous run
+            os.remove(path)
+        uvicorn.run(app, uds=path)
+    else:
+        parsed = urlparse(url)
+        uvicorn.run(app, host=parsed.hostname or "127.0.0.1", port=parsed.port or 8100)
+
+
+if __name__ == "__main__":
+    main()
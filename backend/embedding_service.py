@@ -0,0 +1,146 @@
+import os
+import threading
+import time
+from typing import Callable, List, Optional
+
+import httpx
+from langchain_core.embeddings import Embeddings
+
+# unix:///run/embeddings.sock or http://127.0.0.1:8100; empty embeds in-process
+EMBEDDING_SERVICE_URL = os.getenv("EMBEDDING_SERVICE_URL", "").strip()
+EMBEDDING_SERVICE_TIMEOUT = float(os.getenv("EMBEDDING_SERVICE_TIMEOUT", "30"))
+# Seconds before an unreachable service is tried again
+EMBEDDING_SERVICE_RETRY = float(os.getenv("EMBEDDING_SERVICE_RETRY", "30"))
+
+
+def service_client(url: str = EMBEDDING_SERVICE_URL, timeout: float = EMBEDDING_SERVICE_TIMEOUT) -> httpx.Client:
+    """HTTP client for the embedding service, over a Unix socket for unix:// URLs."""
+    if url.startswith("unix://"):
+        return httpx.Client(
+            transport=httpx.HTTPTransport(uds=url[len("unix://"):]),
+            base_url="http://embeddings",
+            timeout=timeout
+        )
+    return httpx.Client(base_url=url, timeout=timeout)
+
+
+class LazyEmbeddings(Embeddings):
+    """Builds the wrapped model on first use, so unused fallbacks cost nothing."""
+
+    def __init__(self, factory: Callable[[], Embeddings]):
+        self.factory = factory
+        self._model = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._model is not None
+
+    def model(self) -> Embeddings:
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    print("🧠 Loading in-process embedding model")
+                    self._model = self.factory()
+        return self._model
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.model().embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.model().embed_query(text)
+
+
+class RemoteEmbeddings(Embeddings):
+    """Embeddings from the shared embedding server (see embedding_server.py).
+
+    One server process holds the model for every uvicorn worker and batches
+    their questions together. While it is unreachable, or serves another
+    model than `model_name`, texts are embedded by `fallback` in-process and
+    the service is tried again after EMBEDDING_SERVICE_RETRY seconds.
+    """
+
+    def __init__(self, url: str, model_name: str, fallback: Embeddings,
+                 timeout: float = EMBEDDING_SERVICE_TIMEOUT, retry_after: float = EMBEDDING_SERVICE_RETRY):
+        self.url = url
+        self.model_name = model_name
+        self.fallback = fallback
+        self.retry_after = retry_after
+        self._client = service_client(url, timeout)
+        self._lock = threading.Lock()
+        self._checked = False
+        self._down_until = 0.0
+        self.remote_calls = 0
+        self.fallback_calls = 0
+        self.failures = 0
+
+    def _available(self) -> bool:
+        if time.monotonic() < self._down_until:
+            return False
+        if self._checked:
+            return True
+        try:
+            response = self._client.get("/health")
+            response.raise_for_status()
+            served = response.json().get("model")
+        except (httpx.HTTPError, ValueError) as e:
+            self._mark_down(f"unreachable ({str(e)})")
+            return False
+        if served != self.model_name:
+            self._mark_down(f"serves {served}, expected {self.model_name}")
+            return False
+        self._checked = True
+        print(f"🔌 Using embedding service at {self.url}")
+        return True
+
+    def _mark_down(self, reason: str):
+        with self._lock:
+            self.failures += 1
+            self._checked = False
+            self._down_until = time.monotonic() + self.retry_after
+        print(f"⚠️ Embedding service at {self.url} {reason}; embedding in-process")
+
+    def _embed(self, path: str, texts: List[str]) -> Optional[List[List[float]]]:
+        if not texts or not self._available():
+            return None
+        try:
+            response = self._client.post(path, json={"texts": texts})
+            response.raise_for_status()
+            vectors = response.json()["vectors"]
+        except (httpx.HTTPError, ValueError, KeyError) as e:
+            self._mark_down(f"failed ({str(e)})")
+            return None
+        with self._lock:
+            self.remote_calls += 1
+        return vectors
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        vectors = self._embed("/embed/documents", texts)
+        if vectors is None:
+            with self._lock:
+                self.fallback_calls += 1
+            return self.fallback.embed_documents(texts)
+        return vectors
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """Questions, batched by the server with those of the other workers."""
+        vectors = self._embed("/embed/queries", texts)
+        if vectors is None:
+            with self._lock:
+                self.fallback_calls += 1
+            return self.fallback.embed_documents(texts)
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_queries([text])[0]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "url": self.url,
+                "available": self._checked and time.monotonic() >= self._down_until,
+                "remote_calls": self.remote_calls,
+                "fallback_calls": self.fallback_calls,
+                "failures": self.failures,
+                "fallback_loaded": getattr(self.fallback, "loaded", True),
+            }
@@ -0,0 +1,528 @@
+import asyncio
+import hashlib
+import os
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from uuid import uuid4
+import numpy as np
+from dotenv import load_dotenv
+from supabase import create_client
+from qdrant_client.models import PointStruct, PointIdsList
+from agents import create_agent
+from document_loader import parse_files_parallel
+from web_crawler import WebsiteCrawler, CRAWL_MAX_PAGES
+from vectorstore_setup import get_qdrant_client, get_embedding_model, EMBEDDING_CACHE_MODEL
+from ingestion_jobs import IngestionJobStore, IngestionQueue
+from document_store import DOCUMENT_STORE, is_upload_path
+from collection_versions import COLLECTION_VERSIONS
+from crawl_state import CRAWL_STATE
+from answer_cache import ANSWER_CACHE
+from collection_placement import COLLECTION_PLACEMENT, SHARED_PROMOTION_POINTS
+from local_index import LOCAL_INDEX
+from chatbot_generations import CHATBOT_GENERATIONS
+
+load_dotenv()
+supabase = create_client(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_KEY"))
+
+# Chunks embedded per forward pass group, halved on failure (adaptive)
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "256"))
+# Points per Qdrant upsert and number of upserts in flight at once
+UPSERT_BATCH_SIZE = int(os.getenv("UPSERT_BATCH_SIZE", "256"))
+UPSERT_PARALLELISM = int(os.getenv("UPSERT_PARALLELISM", "4"))
+MAX_BATCH_RETRIES = int(os.getenv("INGESTION_MAX_RETRIES", "3"))
+# Rough chunk yield of uploads and crawled pages, used to size new collections
+BYTES_PER_CHUNK_ESTIMATE = 2000
+CHUNKS_PER_PAGE_ESTIMATE = 5
+# Seconds between re-crawls of website-backed chatbots; 0 turns the refresh off
+WEBSITE_REFRESH_INTERVAL = float(os.getenv("WEBSITE_REFRESH_INTERVAL", "0"))
+# Larger documents are streamed through without keeping a chunk cache copy in memory
+CHUNK_CACHE_MAX_CHUNKS = int(os.getenv("CHUNK_CACHE_MAX_CHUNKS", "5000"))
+# Splitter settings for uploads
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 200
+# Cached chunks are only reused with the same embedding model and splitter settings
+CHUNK_CACHE_VARIANT = f"{EMBEDDING_CACHE_MODEL}:{CHUNK_SIZE}:{CHUNK_OVERLAP}"
+
+
+def with_retries(fn, description: str, retries: int = MAX_BATCH_RETRIES):
+    """Call fn(), retrying with exponential backoff before giving up."""
+    for attempt in range(1, retries + 1):
+        try:
+            return fn()
+        except Exception as e:
+            if attempt == retries:
+                raise RuntimeError(f"{description} failed after {retries} attempts: {str(e)}")
+            print(f"⚠️ {description} failed (attempt {attempt}/{retries}): {str(e)}")
+            time.sleep(2 ** (attempt - 1))
+
+
+def embed_texts(texts: list, batch_size: int) -> list:
+    """Embed texts in large batches, halving the batch size when a pass fails."""
+    embeddings = get_embedding_model()
+    vectors = []
+    i = 0
+    while i < len(texts):
+        batch = texts[i:i + batch_size]
+        try:
+            vectors.extend(embeddings.embed_documents(batch))
+            i += len(batch)
+        except Exception as e:
+            if batch_size == 1:
+                raise
+            batch_size = max(1, batch_size // 2)
+            print(f"⚠️ Embedding batch failed ({str(e)}), retrying with batch_size={batch_size}")
+    return vectors
+
+
+def embed_and_upsert(qdrant, collection_name: str, chunks: list, job_id: str, store: IngestionJobStore, vectors=None, tenant: str = None) -> list:
+    """Embed chunks and upsert them to Qdrant, with upserts pipelined behind embedding.
+
+    Pass `vectors` to skip embedding for chunks whose vectors are already
+    known. Points use the same payload layout as the LangChain Qdrant
+    vectorstore; in a shared collection, `tenant` is stored as
+    metadata.chatbot_id. Returns the vectors of all chunks, in order.
+    """
+    pending = []
+    all_vectors = []
+
+    def upsert(points):
+        with_retries(
+            lambda: qdrant.upsert(collection_name=collection_name, points=points, wait=True),
+            f"Upsert of {len(points)} points"
+        )
+        store.increment(job_id, chunks_embedded=len(points))
+
+    with ThreadPoolExecutor(max_workers=UPSERT_PARALLELISM, thread_name_prefix="upsert") as pool:
+        for i in range(0, len(chunks), EMBED_BATCH_SIZE):
+            batch = chunks[i:i + EMBED_BATCH_SIZE]
+            if vectors is not None:
+                batch_vectors = vectors[i:i + EMBED_BATCH_SIZE]
+            else:
+                batch_vectors = embed_texts([doc.page_content for doc in batch], EMBED_BATCH_SIZE)
+            all_vectors.extend(batch_vectors)
+            points = [
+                PointStruct(
+                    id=uuid4().hex,
+                    vector=list(map(float, vector)),
+                    payload={
+                        "page_content": doc.page_content,
+                        "metadata": {**doc.metadata, "chatbot_id": tenant} if tenant else doc.metadata
+                    }
+                )
+                for doc, vector in zip(batch, batch_vectors)
+            ]
+            for j in range(0, len(points), UPSERT_BATCH_SIZE):
+                pending.append(pool.submit(upsert, points[j:j + UPSERT_BATCH_SIZE]))
+
+            # Backpressure: do not run further ahead of Qdrant than the pool allows
+            while len(pending) > UPSERT_PARALLELISM * 2:
+                pending.pop(0).result()
+            print(f"✅ Embedded {min(i + EMBED_BATCH_SIZE, len(chunks))}/{len(chunks)} chunks")
+
+        for future in pending:
+            future.result()
+
+    return all_vectors
+
+
+def file_document_id(path: str) -> str:
+    """Content hash of a file: from the document store, or computed for legacy uploads."""
+    if not is_upload_path(path):
+        raise ValueError(f"{path} is not an uploaded file")
+    sha256 = DOCUMENT_STORE.hash_for_path(path)
+    if sha256:
+        return sha256
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def is_fully_indexed(chatbot_id: str, document_id: str, points: int) -> bool:
+    """Whether a document's points in the index are those of a completed ingestion.
+
+    Documents indexed before completions were recorded are checked against
+    their cached chunk count instead.
+    """
+    if not points:
+        return False
+    expected = DOCUMENT_STORE.indexed_points(chatbot_id, document_id)
+    if expected is None:
+        cached = DOCUMENT_STORE.load_chunks(document_id, CHUNK_CACHE_VARIANT)
+        expected = len(cached[0]) if cached else None
+    return expected == points
+
+
+def tag_chunks(chunks: list, document_id: str) -> list:
+    """Record where each chunk comes from, so it can be updated or deleted on its own."""
+    for doc in chunks:
+        doc.metadata["document_id"] = document_id
+        doc.metadata["content_hash"] = hashlib.sha256(doc.page_content.encode("utf-8")).hexdigest()
+    return chunks
+
+
+def indexed_chunks(qdrant, collection_name: str, points_filter=None) -> dict:
+    """Map (document_id, content_hash) -> point ids for every point in the collection
+    (or, in a shared collection, every point matching `points_filter`).
+
+    Points written before chunks were tagged map to (None, None).
+    """
+    index = defaultdict(list)
+    offset = None
+    while True:
+        points, offset = qdrant.scroll(
+            collection_name=collection_name,
+            scroll_filter=points_filter,
+            limit=1000,
+            offset=offset,
+            with_payload=["metadata"],
+            with_vectors=False
+        )
+        for point in points:
+            metadata = (point.payload or {}).get("metadata") or {}
+            index[(metadata.get("document_id"), metadata.get("content_hash"))].append(point.id)
+        if offset is None:
+            return index
+
+
+def sync_collection(qdrant, collection_name: str, chatbot_id: str, payload: dict, job_id: str, store: IngestionJobStore,
+                    points_filter=None, reuse_existing: bool = True) -> int:
+    """Bring a collection in line with a chatbot's documents, incrementally.
+
+    Every point carries the id of its source document (file hash or
+    "web:<url>") and the hash of its text. Only chunks that are not indexed
+    yet are embedded; points of removed files, changed pages and untagged
+    legacy points are deleted once the new ones are in, so the chatbot
+    keeps answering from the old index until then.
+
+    With payload["web_only"] (scheduled website refresh) the files are
+    left as they are and only the website is re-crawled.
+
+    In a shared collection, `points_filter` selects the chatbot's points
+    and new points are tagged with its id. reuse_existing=False re-indexes
+    everything and then drops all previous points (rebuild in place).
+
+    Returns the number of chunks embedded.
+    """
+    tenant = str(chatbot_id) if points_filter is not None else None
+    previous = indexed_chunks(qdrant, collection_name, points_filter)
+    existing = previous if reuse_existing else {}
+    errors_before = len(store.get(job_id)["errors"])
+    existing_points = defaultdict(int)
+    for (document_id, _), ids in existing.items():
+        existing_points[document_id] += len(ids)
+    keep = set()
+    if payload.get("web_only"):
+        keep.update(key for key in existing if not (key[0] and key[0].startswith("web:")))
+    seen_documents = set()
+    # Documents indexed again in full: all their earlier points go, whatever their hash
+    replaced_documents = set()
+    chunks_done = 0
+
+    # Files that have to be parsed, with their document id
+    to_parse = {}
+    for path in payload.get("files", []):
+        document_id = None
+        try:
+            document_id = file_document_id(path)
+            if document_id in seen_documents:
+                print(f"⏭️ Same content as an earlier file: {path}")
+            elif is_fully_indexed(chatbot_id, document_id, existing_points[document_id]):
+                # Unchanged file: its points stay as they are
+                keep.update(key for key in existing if key[0] == document_id)
+                print(f"⏭️ Already indexed: {path}")
+            else:
+                if existing_points[document_id]:
+                    print(f"🔁 {path} was only partly indexed, indexing it again")
+                # Documents already parsed and embedded (by any chatbot) come from the cache;
+                # a rebuild re-parses and re-embeds everything and refreshes the cache
+                cached = None if payload.get("rebuild") else DOCUMENT_STORE.load_chunks(document_id, CHUNK_CACHE_VARIANT)
+                if cached is None:
+                    to_parse[path] = document_id
+                    seen_documents.add(document_id)
+                    continue
+                print(f"♻️ Reusing cached chunks for {path}")
+                chunks, vectors = cached
+                tag_chunks(chunks, document_id)
+                store.increment(job_id, chunks_total=len(chunks))
+                embed_and_upsert(qdrant, collection_name, chunks, job_id, store, vectors, tenant)
+                chunks_done += len(chunks)
+                keep.update((document_id, doc.metadata["content_hash"]) for doc in chunks)
+                replaced_documents.add(document_id)
+                DOCUMENT_STORE.mark_indexed(chatbot_id, document_id, len(chunks))
+        except Exception as e:
+            print(f"❌ Error loading {path}: {str(e)}")
+            store.add_error(job_id, f"Failed to ingest {path}: {str(e)}")
+            # Do not drop what was indexed for a file we could not read this time
+            keep.update(key for key in existing if key[0] is not None and not key[0].startswith("web:"))
+        store.increment(job_id, files_done=1)
+        if document_id:
+            seen_documents.add(document_id)
+
+    # New files: parsed on the process pool, embedded as pieces come back
+    parsed = defaultdict(lambda: ([], []))
+    uncached = set()
+    failed = set()
+    indexed_counts = defaultdict(int)
+    for path, chunks, file_done, error in parse_files_parallel(list(to_parse), CHUNK_SIZE, CHUNK_OVERLAP, EMBED_BATCH_SIZE):
+        document_id = to_parse[path]
+        if error:
+            print(f"❌ {error}")
+            store.add_error(job_id, error)
+            uncached.add(path)
+            failed.add(path)
+        elif chunks:
+            try:
+                tag_chunks(chunks, document_id)
+                store.increment(job_id, chunks_total=len(chunks))
+                vectors = embed_and_upsert(qdrant, collection_name, chunks, job_id, store, tenant=tenant)
+                chunks_done += len(chunks)
+                indexed_counts[path] += len(chunks)
+                keep.update((document_id, doc.metadata["content_hash"]) for doc in chunks)
+                if path not in uncached:
+                    parsed[path][0].extend(chunks)
+                    parsed[path][1].append(np.asarray(vectors, dtype=np.float32))
+                    if len(parsed[path][0]) > CHUNK_CACHE_MAX_CHUNKS:
+                        print(f"📚 {path} is too large for the chunk cache, streaming it through")
+                        parsed.pop(path)
+                        uncached.add(path)
+            except Exception as e:
+                print(f"❌ Error ingesting {path}: {str(e)}")
+                store.add_error(job_id, f"Failed to ingest {path}: {str(e)}")
+                uncached.add(path)
+                failed.add(path)
+        if file_done:
+            file_chunks, file_vectors = parsed.pop(path, ([], []))
+            if path not in uncached and file_chunks and DOCUMENT_STORE.hash_for_path(path):
+                DOCUMENT_STORE.save_chunks(document_id, CHUNK_CACHE_VARIANT, file_chunks, np.concatenate(file_vectors))
+            if path not in failed:
+                replaced_documents.add(document_id)
+                DOCUMENT_STORE.mark_indexed(chatbot_id, document_id, indexed_counts.pop(path, 0))
+            store.increment(job_id, files_done=1)
+
+    website_url = payload.get("website_url")
+    if website_url:
+        try:
+            print(f"🌐 Scraping website: {website_url}")
+            # Conditional re-crawl, trusting only pages whose points are still there
+            indexed_pages = {key[0][len("web:"):] for key in existing if key[0] and key[0].startswith("web:")}
+            known = {url: page for url, page in CRAWL_STATE.load(chatbot_id).items() if url in indexed_pages}
+            crawler = WebsiteCrawler(website_url, known=known)
+            scraped_chunks = asyncio.run(crawler.crawl())
+            print(f"✅ Scraped {len(scraped_chunks)} chunks from changed pages")
+            for doc in scraped_chunks:
+                tag_chunks([doc], f"web:{doc.metadata['url']}")
+            new_chunks = [
+                doc for doc in scraped_chunks
+                if (doc.metadata["document_id"], doc.metadata["content_hash"]) not in existing
+            ]
+            keep.update((doc.metadata["document_id"], doc.metadata["content_hash"]) for doc in scraped_chunks)
+            # Unchanged pages, and known ones we could not reach this time, keep their points
+            kept_pages = {f"web:{url}" for url in crawler.unchanged | crawler.failed}
+            keep.update(key for key in existing if key[0] in kept_pages)
+            store.increment(job_id, chunks_total=len(new_chunks))
+            embed_and_upsert(qdrant, collection_name, new_chunks, job_id, store, tenant=tenant)
+            chunks_done += len(new_chunks)
+            # Only now that the pages are indexed can the next crawl rely on this state
+            pages = dict(crawler.pages)
+            pages.update({url: known[url] for url in crawler.failed if url not in pages})
+            CRAWL_STATE.replace(chatbot_id, pages)
+        except Exception as e:
+            print(f"⚠️ Failed to scrape site: {e}")
+            store.add_error(job_id, f"Failed to scrape {website_url}: {str(e)}")
+            # Keep serving the previously scraped pages
+            keep.update(key for key in existing if key[0] and key[0].startswith("web:"))
+    else:
+        CRAWL_STATE.drop_chatbot(chatbot_id)
+
+    # Swap: new points are in, now drop the ones nothing refers to anymore
+    if reuse_existing:
+        stale_ids = [
+            point_id for key, ids in previous.items()
+            if key not in keep or key[0] in replaced_documents
+            for point_id in ids
+        ]
+    elif len(store.get(job_id)["errors"]) > errors_before:
+        # Incomplete rebuild: keep the old points rather than lose documents
+        stale_ids = []
+    else:
+        stale_ids = [point_id for ids in previous.values() for point_id in ids]
+    for i in range(0, len(stale_ids), UPSERT_BATCH_SIZE):
+        batch = stale_ids[i:i + UPSERT_BATCH_SIZE]
+        with_retries(
+            lambda: qdrant.delete(collection_name=collection_name, points_selector=PointIdsList(points=batch), wait=True),
+            f"Delete of {len(batch)} stale points"
+        )
+    if stale_ids:
+        print(f"🧹 Removed {len(stale_ids)} stale points")
+
+
+    return chunks_done
+
+
+def estimate_points(payload: dict) -> int:
+    """Rough number of chunks a job will index, to pick the collection profile."""
+    total_bytes = 0
+    for path in payload.get("files", []):
+        try:
+            total_bytes += os.path.getsize(path)
+        except OSError:
+            pass
+    pages = CRAWL_MAX_PAGES if payload.get("website_url") else 0
+    return total_bytes // BYTES_PER_CHUNK_ESTIMATE + pages * CHUNKS_PER_PAGE_ESTIMATE
+
+
+def promote_to_dedicated(qdrant, placement):
+    """Move a chatbot that outgrew its shared collection into its own one.
+
+    Points are copied with their vectors (nothing is re-embedded) into a
+    new version behind the chatbot_{id} alias; the placement switches once
+    the alias is live, and only then are the shared copies deleted.
+    """
+    chatbot_id = placement.chatbot_id
+    target = COLLECTION_VERSIONS.new_version_name(chatbot_id)
+    print(f"📈 Chatbot {chatbot_id} outgrew {placement.collection_name}, moving it to {target}")
+    create_agent(qdrant, target[len("chatbot_"):], COLLECTION_PLACEMENT.count_points(qdrant, placement))
+    try:
+        copied = COLLECTION_PLACEMENT.copy_points(qdrant, placement, target)
+        COLLECTION_VERSIONS.promote(qdrant, chatbot_id, target)
+    except Exception:
+        COLLECTION_VERSIONS.retire(target)
+        raise
+    COLLECTION_PLACEMENT.set_dedicated(chatbot_id)
+    COLLECTION_PLACEMENT.delete_points(qdrant, placement)
+    print(f"✅ Moved {copied} points of chatbot {chatbot_id} to a dedicated collection")
+
+
+def run_ingestion_job(job: dict, store: IngestionJobStore):
+    """Index the documents of one chatbot.
+
+    payload:
+        files: paths of all the chatbot's files
+        website_url: optional site to scrape
+        web_only: only re-crawl the website (scheduled refresh)
+        rebuild: build a fresh collection version and swap the alias to it
+            (re-index in place for a chatbot in a shared collection)
+    """
+    job_id = job["id"]
+    chatbot_id = job["chatbot_id"]
+    payload = job["payload"]
+    qdrant = get_qdrant_client()
+    placement = COLLECTION_PLACEMENT.assign(qdrant, chatbot_id)
+    collection_name = placement.collection_name
+    started = time.monotonic()
+
+    if placement.shared:
+        # Pooled collection: points are this chatbot's by their metadata.chatbot_id
+        print(f"🧺 Indexing chatbot {chatbot_id} in shared collection {collection_name}")
+        chunks_done = sync_collection(
+            qdrant, collection_name, chatbot_id, payload, job_id, store,
+            points_filter=placement.points_filter(),
+            reuse_existing=not payload.get("rebuild")
+        )
+        if COLLECTION_PLACEMENT.count_points(qdrant, placement) > SHARED_PROMOTION_POINTS:
+            promote_to_dedicated(qdrant, placement)
+    elif payload.get("rebuild"):
+        # Blue/green: build next to the live collection, then flip the alias
+        shadow_name = COLLECTION_VERSIONS.new_version_name(chatbot_id)
+        print(f"🏗️ Rebuilding {collection_name} into {shadow_name}")
+        create_agent(qdrant, shadow_name[len("chatbot_"):], estimate_points(payload))
+        errors_before = len(store.get(job_id)["errors"])
+        try:
+            chunks_done = sync_collection(qdrant, shadow_name, chatbot_id, payload, job_id, store)
+        except Exception:
+            COLLECTION_VERSIONS.retire(shadow_name)
+            raise
+        if len(store.get(job_id)["errors"]) > errors_before:
+            COLLECTION_VERSIONS.retire(shadow_name)
+            raise RuntimeError("Rebuild incomplete, keeping the current index")
+        COLLECTION_VERSIONS.promote(qdrant, chatbot_id, shadow_name)
+    else:
+        print("🤖 Creating agent and collection...")
+        create_agent(qdrant, str(chatbot_id), estimate_points(payload))
+        chunks_done = sync_collection(qdrant, collection_name, chatbot_id, payload, job_id, store)
+
+    # Answers cached before the re-index may no longer match the documents;
+    # other workers drop theirs, and their in-process copies, on the bump
+    CHATBOT_GENERATIONS.bump(chatbot_id)
+    if ANSWER_CACHE:
+        ANSWER_CACHE.invalidate(chatbot_id)
+    # An in-process copy of the chatbot is reloaded from the updated collection
+    if LOCAL_INDEX:
+        try:
+            LOCAL_INDEX.refresh(COLLECTION_PLACEMENT.resolve(qdrant, chatbot_id))
+        except Exception as e:
+            print(f"⚠️ Could not refresh local index: {str(e)}")
+            LOCAL_INDEX.invalidate(chatbot_id)
+
+    elapsed = time.monotonic() - started
+    chunks_per_sec = chunks_done / elapsed if elapsed > 0 else 0.0
+    store.update(job_id, chunks_per_sec=chunks_per_sec)
+    print(f"⚡ Ingested {chunks_done} chunks at {chunks_per_sec:.1f} chunks/sec")
+
+    if chunks_done or not payload.get("web_only"):
+        supabase.table("chatbots").update({
+            "updated_at": datetime.utcnow().isoformat()
+        }).eq("id", chatbot_id).execute()
+
+
+JOB_STORE = IngestionJobStore()
+INGESTION_QUEUE = IngestionQueue(JOB_STORE, run_ingestion_job)
+
+
+class WebsiteRefresher:
+    """Periodically queues a web-only re-crawl for every chatbot with a website.
+
+    Re-crawls are conditional (see WebsiteCrawler), so pages that did not
+    change cost a 304 or a hash comparison, not an embedding.
+    """
+
+    def __init__(self, queue: IngestionQueue, interval: float = WEBSITE_REFRESH_INTERVAL):
+        self.queue = queue
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def refresh_all(self) -> int:
+        """Queue a refresh for each website-backed chatbot not already being ingested."""
+        resp = supabase.table("chatbots").select("id,user_id,website_url").execute()
+        queued = 0
+        for chatbot in resp.data or []:
+            if not chatbot.get("website_url"):
+                continue
+            # Skipped if a job is queued or running; checked atomically, as
+            # every worker runs a refresher
+            job = self.queue.enqueue(chatbot["id"], chatbot.get("user_id"), "refresh", {
+                "website_url": chatbot["website_url"],
+                "web_only": True
+            }, only_if_idle=True)
+            if job:
+                queued += 1
+        if queued:
+            print(f"🔄 Queued website refresh for {queued} chatbots")
+        return queued
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.refresh_all()
+            except Exception as e:
+                print(f"⚠️ Website refresh failed: {str(e)}")
+
+    def start(self):
+        if self.interval <= 0:
+            return
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, name="website-refresh", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+
+WEBSITE_REFRESHER = WebsiteRefresher(INGESTION_QUEUE)
@@ -0,0 +1,237 @@
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Callable, Optional
+from uuid import uuid4
+
+from local_db import get_connection
+
+INGESTION_WORKERS = int(os.getenv("INGESTION_WORKERS", "2"))
+# A running job whose progress has not moved for this long is considered orphaned
+STALE_JOB_MINUTES = int(os.getenv("INGESTION_STALE_JOB_MINUTES", "15"))
+
+JOB_COUNTERS = ("files_total", "files_done", "chunks_total", "chunks_embedded")
+ADDED_COLUMNS = {"chunks_per_sec": "REAL"}
+
+
+class IngestionJobStore:
+    """Ingestion jobs persisted in the local SQLite database."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._conn = get_connection()
+        with self._lock, self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS ingestion_jobs (
+                    id TEXT PRIMARY KEY,
+                    chatbot_id TEXT NOT NULL,
+                    user_id TEXT,
+                    kind TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    files_total INTEGER DEFAULT 0,
+                    files_done INTEGER DEFAULT 0,
+                    chunks_total INTEGER DEFAULT 0,
+                    chunks_embedded INTEGER DEFAULT 0,
+                    chunks_per_sec REAL,
+                    errors TEXT DEFAULT '[]',
+                    created_at TEXT NOT NULL,
+                    updated_at TEXT NOT NULL,
+                    started_at TEXT,
+                    finished_at TEXT
+                )
+            """)
+            # Columns added after the table was first created
+            columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(ingestion_jobs)")}
+            for name, ddl in ADDED_COLUMNS.items():
+                if name not in columns:
+                    self._conn.execute(f"ALTER TABLE ingestion_jobs ADD COLUMN {name} {ddl}")
+
+    def _row_to_job(self, row) -> Optional[dict]:
+        if row is None:
+            return None
+        job = dict(row)
+        job["payload"] = json.loads(job["payload"])
+        job["errors"] = json.loads(job["errors"] or "[]")
+        return job
+
+    def create(self, chatbot_id: str, user_id: str, kind: str, payload: dict) -> dict:
+        """Queue a job carrying the chatbot's full state.
+
+        Older queued jobs of the chatbot are superseded: the new payload lists
+        every file and the website, so running them first would be wasted work.
+        A pending rebuild is carried over to the new job.
+        """
+        now = datetime.utcnow().isoformat()
+        job_id = str(uuid4())
+        with self._lock, self._conn:
+            pending = self._conn.execute(
+                "SELECT payload FROM ingestion_jobs WHERE chatbot_id = ? AND status = 'queued'",
+                (str(chatbot_id),)
+            ).fetchall()
+            if any(json.loads(row["payload"]).get("rebuild") for row in pending):
+                payload = {**payload, "rebuild": True}
+            self._conn.execute(
+                "UPDATE ingestion_jobs SET status = 'superseded', updated_at = ?, finished_at = ? "
+                "WHERE chatbot_id = ? AND status = 'queued'",
+                (now, now, str(chatbot_id))
+            )
+            self._conn.execute(
+                "INSERT INTO ingestion_jobs (id, chatbot_id, user_id, kind, status, payload, files_total, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, 'queued', ?, ?, ?, ?)",
+                (job_id, str(chatbot_id), str(user_id), kind, json.dumps(payload), len(payload.get("files", [])), now, now)
+            )
+        return self.get(job_id)
+
+    def create_if_idle(self, chatbot_id: str, user_id: str, kind: str, payload: dict) -> Optional[dict]:
+        """Queue a job unless the chatbot already has a queued or running one.
+
+        The check and the insert are one statement, so workers racing on the
+        same chatbot queue it once.
+        """
+        now = datetime.utcnow().isoformat()
+        job_id = str(uuid4())
+        with self._lock, self._conn:
+            cur = self._conn.execute(
+                "INSERT INTO ingestion_jobs (id, chatbot_id, user_id, kind, status, payload, files_total, created_at, updated_at) "
+                "SELECT ?, ?, ?, ?, 'queued', ?, ?, ?, ? WHERE NOT EXISTS ("
+                "SELECT 1 FROM ingestion_jobs WHERE chatbot_id = ? AND status IN ('queued', 'running'))",
+                (job_id, str(chatbot_id), str(user_id), kind, json.dumps(payload), len(payload.get("files", [])), now, now,
+                 str(chatbot_id))
+            )
+        return self.get(job_id) if cur.rowcount == 1 else None
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM ingestion_jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._row_to_job(row)
+
+    def claim(self, job_id: str) -> bool:
+        """Atomically move a queued job to running.
+
+        False if someone else has it, or if another job of the same chatbot is
+        running; that one hands the chatbot over with next_queued() when done.
+        """
+        now = datetime.utcnow().isoformat()
+        with self._lock, self._conn:
+            cur = self._conn.execute(
+                "UPDATE ingestion_jobs SET status = 'running', started_at = ?, updated_at = ? "
+                "WHERE id = ? AND status = 'queued' AND NOT EXISTS ("
+                "SELECT 1 FROM ingestion_jobs AS other WHERE other.chatbot_id = ingestion_jobs.chatbot_id "
+                "AND other.status = 'running')",
+                (now, now, job_id)
+            )
+        return cur.rowcount == 1
+
+    def next_queued(self, chatbot_id: str) -> Optional[str]:
+        """Oldest queued job of a chatbot, if any."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id FROM ingestion_jobs WHERE chatbot_id = ? AND status = 'queued' ORDER BY created_at LIMIT 1",
+                (str(chatbot_id),)
+            ).fetchone()
+        return row["id"] if row else None
+
+    def update(self, job_id: str, **fields):
+        fields["updated_at"] = datetime.utcnow().isoformat()
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock, self._conn:
+            self._conn.execute(f"UPDATE ingestion_jobs SET {columns} WHERE id = ?", (*fields.values(), job_id))
+
+    def increment(self, job_id: str, **deltas):
+        for name in deltas:
+            if name not in JOB_COUNTERS:
+                raise ValueError(f"Unknown job counter: {name}")
+        columns = ", ".join(f"{name} = {name} + ?" for name in deltas)
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"UPDATE ingestion_jobs SET {columns}, updated_at = ? WHERE id = ?",
+                (*deltas.values(), datetime.utcnow().isoformat(), job_id)
+            )
+
+    def add_error(self, job_id: str, message: str):
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT errors FROM ingestion_jobs WHERE id = ?", (job_id,)).fetchone()
+            errors = json.loads(row["errors"] or "[]") if row else []
+            errors.append(message)
+            self._conn.execute(
+                "UPDATE ingestion_jobs SET errors = ?, updated_at = ? WHERE id = ?",
+                (json.dumps(errors), datetime.utcnow().isoformat(), job_id)
+            )
+
+    def finish(self, job_id: str, status: str):
+        now = datetime.utcnow().isoformat()
+        self.update(job_id, status=status, finished_at=now)
+
+    def recoverable(self) -> list:
+        """Jobs to pick up after a restart: queued ones and orphaned running ones."""
+        stale_before = (datetime.utcnow() - timedelta(minutes=STALE_JOB_MINUTES)).isoformat()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE ingestion_jobs SET status = 'queued' WHERE status = 'running' AND updated_at < ?",
+                (stale_before,)
+            )
+            rows = self._conn.execute(
+                "SELECT id FROM ingestion_jobs WHERE status = 'queued' ORDER BY created_at"
+            ).fetchall()
+        return [row["id"] for row in rows]
+
+
+class IngestionQueue:
+    """Runs ingestion jobs on a small thread pool, outside the HTTP request."""
+
+    def __init__(self, store: IngestionJobStore, handler: Callable, workers: int = INGESTION_WORKERS):
+        self.store = store
+        self.handler = handler
+        self.workers = workers
+        self._executor = None
+
+    def _ensure_executor(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="ingestion")
+
+    def start(self):
+        """Start the pool and resume jobs left behind by a previous run."""
+        self._ensure_executor()
+        for job_id in self.store.recoverable():
+            self.submit(job_id)
+
+    def stop(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def submit(self, job_id: str):
+        self._ensure_executor()
+        self._executor.submit(self._run, job_id)
+
+    def enqueue(self, chatbot_id: str, user_id: str, kind: str, payload: dict, only_if_idle: bool = False) -> Optional[dict]:
+        """Queue a job; with only_if_idle, None if the chatbot already has one."""
+        if only_if_idle:
+            job = self.store.create_if_idle(chatbot_id, user_id, kind, payload)
+        else:
+            job = self.store.create(chatbot_id, user_id, kind, payload)
+        if job:
+            self.submit(job["id"])
+        return job
+
+    def _run(self, job_id: str):
+        if not self.store.claim(job_id):
+            return
+        job = self.store.get(job_id)
+        try:
+            self.handler(job, self.store)
+            errors = self.store.get(job_id)["errors"]
+            self.store.finish(job_id, "completed_with_errors" if errors else "completed")
+        except Exception as e:
+            logging.exception(f"Ingestion job {job_id} failed")
+            self.store.add_error(job_id, str(e))
+            self.store.finish(job_id, "failed")
+        finally:
+            # A job queued for the chatbot meanwhile could not be claimed; run it now
+            next_job_id = self.store.next_queued(job["chatbot_id"])
+            if next_job_id and self._executor is not None:
+                self.submit(next_job_id)
@@ -1,26 +1,107 @@
 import os
+import threading
+from collections import OrderedDict
+from typing import Optional
 from dotenv import load_dotenv
 from urllib.parse import urlparse
 from langdetect import detect
 
+import httpx
+import openai
+
 from langchain_openai import ChatOpenAI
 from langchain_core.prompts import PromptTemplate
 from langchain_core.output_parsers import StrOutputParser
 
 load_dotenv()
 
-def get_llm(temperature: float = 0, max_tokens: int = 1000, model: str = "mistralai/mistral-7b-instruct:free"):
-    api_key = os.getenv("OPENROUTER_API_KEY")
-    if not api_key:
-        raise ValueError("Missing OPENROUTER_API_KEY")
-
-    return ChatOpenAI(
-        model=model,
-        api_key=api_key,
-        base_url="https://openrouter.ai/api/v1",
-        temperature=temperature,
-        max_tokens=max_tokens
-    )
+OPENROUTER_BASE_URL = "https://openrouter.ai/api/v1"
+LLM_POOL_SIZE = int(os.getenv("LLM_POOL_SIZE", "32"))
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "100"))
+
+
+class LLMPool:
+    """Keeps ChatOpenAI instances keyed by (model, temperature, max_tokens).
+
+    Every pooled instance talks to OpenRouter through the same sync and async
+    httpx clients, so keep-alive connections and TLS sessions survive across
+    requests. The least recently used instance is dropped past `max_size`.
+    """
+
+    def __init__(self, max_size: int = LLM_POOL_SIZE):
+        self.max_size = max_size
+        self._llms = OrderedDict()
+        self._lock = threading.Lock()
+        self._client = None
+        self._async_client = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _openai_clients(self, api_key: str):
+        if self._client is None:
+            limits = httpx.Limits(
+                max_connections=LLM_MAX_CONNECTIONS,
+                max_keepalive_connections=LLM_MAX_CONNECTIONS,
+                keepalive_expiry=120
+            )
+            self._client = openai.OpenAI(
+                api_key=api_key,
+                base_url=OPENROUTER_BASE_URL,
+                http_client=httpx.Client(limits=limits)
+            )
+            self._async_client = openai.AsyncOpenAI(
+                api_key=api_key,
+                base_url=OPENROUTER_BASE_URL,
+                http_client=httpx.AsyncClient(limits=limits)
+            )
+        return self._client, self._async_client
+
+    def get(self, model: str, temperature: float, max_tokens: Optional[int]) -> ChatOpenAI:
+        # max_tokens=None (no limit) is valid for ChatOpenAI and gets its own entry
+        key = (model, float(temperature), None if max_tokens is None else int(max_tokens))
+        with self._lock:
+            llm = self._llms.get(key)
+            if llm is not None:
+                self._llms.move_to_end(key)
+                self.hits += 1
+                return llm
+
+            api_key = os.getenv("OPENROUTER_API_KEY")
+            if not api_key:
+                raise ValueError("Missing OPENROUTER_API_KEY")
+
+            client, async_client = self._openai_clients(api_key)
+            llm = ChatOpenAI(
+                model=model,
+                api_key=api_key,
+                base_url=OPENROUTER_BASE_URL,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                client=client.chat.completions,
+                async_client=async_client.chat.completions
+            )
+            self._llms[key] = llm
+            self.misses += 1
+            while len(self._llms) > self.max_size:
+                self._llms.popitem(last=False)
+                self.evictions += 1
+            return llm
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._llms),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+LLM_POOL = LLMPool()
+
+def get_llm(temperature: float = 0, max_tokens: Optional[int] = 1000, model: str = "mistralai/mistral-7b-instruct:free"):
+    return LLM_POOL.get(model, temperature, max_tokens)
 
 def extract_brand(website_url: str) -> str:
     if not website_url:
@@ -0,0 +1,18 @@
+import os
+import sqlite3
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Local SQLite file for state that must survive restarts (ingestion jobs, ...)
+DB_PATH = os.getenv(
+    "PLUGMIND_DB_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "plugmind.db")
+)
+
+def get_connection() -> sqlite3.Connection:
+    conn = sqlite3.connect(DB_PATH, timeout=30, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    # WAL lets several uvicorn workers read while one of them writes
+    conn.execute("PRAGMA journal_mode=WAL")
+    return conn
@@ -0,0 +1,259 @@
+import json
+import os
+import shutil
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+from chatbot_generations import CHATBOT_GENERATIONS, ChatbotGenerations
+
+LOCAL_INDEX_ENABLED = os.getenv("LOCAL_INDEX_ENABLED", "false").lower() in ("1", "true", "yes")
+LOCAL_INDEX_DIR = os.getenv(
+    "LOCAL_INDEX_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "local_index")
+)
+# Only chatbots up to this size are served in-process
+LOCAL_INDEX_MAX_POINTS = int(os.getenv("LOCAL_INDEX_MAX_POINTS", "5000"))
+# Resident chatbots at most (least recently queried ones are dropped)
+LOCAL_INDEX_MAX_BOTS = int(os.getenv("LOCAL_INDEX_MAX_BOTS", "32"))
+# Questions within LOCAL_INDEX_HOT_WINDOW seconds that make a chatbot hot
+LOCAL_INDEX_HOT_QUERIES = int(os.getenv("LOCAL_INDEX_HOT_QUERIES", "3"))
+LOCAL_INDEX_HOT_WINDOW = float(os.getenv("LOCAL_INDEX_HOT_WINDOW", "300"))
+# A copy older than this is reloaded; bounds staleness from other worker processes
+LOCAL_INDEX_TTL = float(os.getenv("LOCAL_INDEX_TTL", "900"))
+
+
+def _process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class ChatbotVectors:
+    """One chatbot's points: a memory-mapped matrix of unit vectors plus payloads."""
+
+    def __init__(self, directory: str):
+        with open(os.path.join(directory, "meta.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        with open(os.path.join(directory, "payloads.json"), "r", encoding="utf-8") as f:
+            self.payloads = json.load(f)
+        self.loaded_at = meta["loaded_at"]
+        self.generation = meta.get("generation")
+        count, dim = meta["count"], meta["dim"]
+        self.vectors = (
+            np.memmap(os.path.join(directory, "vectors.f32"), dtype=np.float32, mode="r", shape=(count, dim))
+            if count else np.empty((0, dim), dtype=np.float32)
+        )
+
+    def search(self, query_vector, k: int, score_threshold: Optional[float] = None) -> List[Tuple[Document, float]]:
+        """Top-k by cosine similarity, the same scores Qdrant returns for COSINE."""
+        if not len(self.payloads):
+            return []
+        query = np.asarray(query_vector, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1.0)
+        scores = self.vectors @ query
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        results = []
+        for i in top:
+            score = float(scores[i])
+            if score_threshold is not None and score < score_threshold:
+                break
+            payload = self.payloads[i]
+            results.append((Document(page_content=payload.get("page_content") or "", metadata=payload.get("metadata") or {}), score))
+        return results
+
+
+class LocalIndex:
+    """In-process vector search for small, frequently queried chatbots.
+
+    A chatbot becomes resident after LOCAL_INDEX_HOT_QUERIES questions in
+    LOCAL_INDEX_HOT_WINDOW seconds: its points are copied from Qdrant in the
+    background into LOCAL_INDEX_DIR and memory-mapped. Until then, and for
+    chatbots over LOCAL_INDEX_MAX_POINTS, search() returns None and the
+    caller asks Qdrant as usual. Ingestion calls refresh() so resident
+    copies follow the collection; a copy whose chatbot generation (see
+    ChatbotGenerations) moved since it was loaded, because another worker
+    re-indexed or deleted the chatbot, is dropped and reloaded.
+    """
+
+    def __init__(self, root: str = LOCAL_INDEX_DIR, generations: ChatbotGenerations = CHATBOT_GENERATIONS):
+        self.generations = generations
+        # One directory per worker process; leftovers of dead processes are removed
+        self.root = os.path.join(root, str(os.getpid()))
+        if os.path.isdir(root):
+            for name in os.listdir(root):
+                if name.isdigit() and not _process_alive(int(name)):
+                    shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+        self._lock = threading.Lock()
+        self._resident = OrderedDict()
+        self._recent_queries = {}
+        self._loading = set()
+        # Chatbots found too large, with the time they were checked
+        self._too_large = {}
+        self.hits = 0
+        self.misses = 0
+        self.loads = 0
+
+    def _directory(self, chatbot_id: str) -> str:
+        return os.path.join(self.root, str(chatbot_id))
+
+    def search(self, placement, query_vector, k: int = 4, score_threshold: Optional[float] = None) -> Optional[List[Tuple[Document, float]]]:
+        """(document, score) pairs from the resident copy, or None to go to Qdrant."""
+        chatbot_id = placement.chatbot_id
+        now = time.time()
+        generation = self.generations.get(chatbot_id)
+        with self._lock:
+            index = self._resident.get(chatbot_id)
+            if index is not None and index.generation != generation:
+                # Changed in another worker: serve from Qdrant until reloaded
+                self._resident.pop(chatbot_id, None)
+                self.misses += 1
+                self._start_load(placement)
+                return None
+            if index is not None:
+                self._resident.move_to_end(chatbot_id)
+                self.hits += 1
+                if now - index.loaded_at >= LOCAL_INDEX_TTL:
+                    # Keep serving the current copy while a fresh one loads
+                    self._start_load(placement)
+            else:
+                self.misses += 1
+                self._note_query(placement, now)
+        if index is None:
+            return None
+        return index.search(query_vector, k, score_threshold)
+
+    def _note_query(self, placement, now: float):
+        chatbot_id = placement.chatbot_id
+        if chatbot_id in self._loading or now - self._too_large.get(chatbot_id, 0) < LOCAL_INDEX_TTL:
+            return
+        recent = [t for t in self._recent_queries.get(chatbot_id, []) if now - t < LOCAL_INDEX_HOT_WINDOW]
+        recent.append(now)
+        self._recent_queries[chatbot_id] = recent
+        if len(recent) >= LOCAL_INDEX_HOT_QUERIES:
+            self._recent_queries.pop(chatbot_id, None)
+            self._start_load(placement)
+
+    def _start_load(self, placement):
+        if placement.chatbot_id in self._loading:
+            return
+        self._loading.add(placement.chatbot_id)
+        threading.Thread(target=self._load_in_background, args=(placement,), name="local-index-load", daemon=True).start()
+
+    def _load_in_background(self, placement):
+        try:
+            self.load(placement)
+        except Exception as e:
+            print(f"⚠️ Could not load local index for chatbot {placement.chatbot_id}: {str(e)}")
+        finally:
+            with self._lock:
+                self._loading.discard(placement.chatbot_id)
+
+    def load(self, placement) -> bool:
+        """Copy a chatbot's points from Qdrant and make them resident."""
+        # Imported here: loading the embedding model is not needed to serve resident copies
+        from vectorstore_setup import get_qdrant_client
+
+        chatbot_id = placement.chatbot_id
+        # Read first: a change while copying makes the copy stale, not current
+        generation = self.generations.get(chatbot_id)
+        client = get_qdrant_client()
+        count = client.count(
+            collection_name=placement.collection_name, count_filter=placement.points_filter(), exact=True
+        ).count
+        if count > LOCAL_INDEX_MAX_POINTS:
+            with self._lock:
+                self._too_large[chatbot_id] = time.time()
+                self._resident.pop(chatbot_id, None)
+            return False
+
+        vectors, payloads = [], []
+        offset = None
+        while True:
+            points, offset = client.scroll(
+                collection_name=placement.collection_name,
+                scroll_filter=placement.points_filter(),
+                limit=1000,
+                offset=offset,
+                with_payload=["page_content", "metadata"],
+                with_vectors=True
+            )
+            for point in points:
+                vectors.append(point.vector)
+                payloads.append(point.payload or {})
+            if offset is None:
+                break
+
+        matrix = np.asarray(vectors, dtype=np.float32) if vectors else np.empty((0, 0), dtype=np.float32)
+        if len(matrix):
+            matrix /= np.clip(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12, None)
+
+        # Write next to the live copy, then swap directories
+        directory = self._directory(chatbot_id)
+        tmp_directory = f"{directory}.tmp{threading.get_ident()}"
+        os.makedirs(tmp_directory, exist_ok=True)
+        if len(matrix):
+            matrix.tofile(os.path.join(tmp_directory, "vectors.f32"))
+        with open(os.path.join(tmp_directory, "payloads.json"), "w", encoding="utf-8") as f:
+            json.dump(payloads, f, ensure_ascii=False)
+        with open(os.path.join(tmp_directory, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump({"count": len(matrix), "dim": matrix.shape[1] if len(matrix) else 0, "loaded_at": time.time(), "generation": generation}, f)
+        old_directory = f"{directory}.old{threading.get_ident()}"
+        if os.path.exists(directory):
+            os.replace(directory, old_directory)
+        os.replace(tmp_directory, directory)
+        shutil.rmtree(old_directory, ignore_errors=True)
+
+        index = ChatbotVectors(directory)
+        with self._lock:
+            self._resident[chatbot_id] = index
+            self._resident.move_to_end(chatbot_id)
+            while len(self._resident) > LOCAL_INDEX_MAX_BOTS:
+                evicted, _ = self._resident.popitem(last=False)
+                shutil.rmtree(self._directory(evicted), ignore_errors=True)
+            self.loads += 1
+        print(f"⚡ Chatbot {chatbot_id} served in-process ({len(matrix)} points)")
+        return True
+
+    def refresh(self, placement):
+        """After ingestion: reload a resident chatbot, forget anything else about it."""
+        with self._lock:
+            resident = placement.chatbot_id in self._resident
+            self._too_large.pop(placement.chatbot_id, None)
+        if resident:
+            self.load(placement)
+
+    def invalidate(self, chatbot_id: str):
+        with self._lock:
+            self._resident.pop(str(chatbot_id), None)
+            self._recent_queries.pop(str(chatbot_id), None)
+            self._too_large.pop(str(chatbot_id), None)
+        shutil.rmtree(self._directory(chatbot_id), ignore_errors=True)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        with self._lock:
+            resident = {chatbot_id: len(index.payloads) for chatbot_id, index in self._resident.items()}
+        return {
+            "resident": len(resident),
+            "points": sum(resident.values()),
+            "max_bots": LOCAL_INDEX_MAX_BOTS,
+            "max_points": LOCAL_INDEX_MAX_POINTS,
+            "hits": self.hits,
+            "misses": self.misses,
+            "loads": self.loads,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+LOCAL_INDEX = LocalIndex() if LOCAL_INDEX_ENABLED else None
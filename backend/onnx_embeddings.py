@@ -0,0 +1,130 @@
+import os
+import threading
+from typing import List
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+EMBEDDING_ONNX_DIR = os.getenv(
+    "EMBEDDING_ONNX_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "onnx_models")
+)
+# Intra-op threads for ONNX Runtime; 0 lets it use every core
+EMBEDDING_ONNX_THREADS = int(os.getenv("EMBEDDING_ONNX_THREADS", "0"))
+# all-MiniLM-L6-v2 is trained on 256 word pieces; longer input is truncated like in sentence-transformers
+EMBEDDING_MAX_SEQ_LENGTH = int(os.getenv("EMBEDDING_MAX_SEQ_LENGTH", "256"))
+
+
+def export_onnx(model_name: str, quantize: bool = False, onnx_dir: str = EMBEDDING_ONNX_DIR) -> str:
+    """Export a Hugging Face encoder to ONNX once, optionally int8-quantized.
+
+    Returns the path of the .onnx file; later calls reuse it.
+    """
+    slug = model_name.replace("/", "__")
+    model_dir = os.path.join(onnx_dir, slug)
+    fp32_path = os.path.join(model_dir, "model.onnx")
+    int8_path = os.path.join(model_dir, "model_int8.onnx")
+    target = int8_path if quantize else fp32_path
+    if os.path.exists(target):
+        return target
+
+    os.makedirs(model_dir, exist_ok=True)
+    if not os.path.exists(fp32_path):
+        # torch and transformers come with sentence-transformers; only needed for the export
+        import torch
+        from transformers import AutoModel, AutoTokenizer
+
+        print(f"📦 Exporting {model_name} to ONNX")
+        tokenizer = AutoTokenizer.from_pretrained(model_name)
+        model = AutoModel.from_pretrained(model_name).eval()
+        sample = tokenizer(["export"], return_tensors="pt")
+        tmp_path = f"{fp32_path}.tmp"
+        with torch.no_grad():
+            torch.onnx.export(
+                model,
+                (sample["input_ids"], sample["attention_mask"], sample["token_type_ids"]),
+                tmp_path,
+                input_names=["input_ids", "attention_mask", "token_type_ids"],
+                output_names=["last_hidden_state"],
+                dynamic_axes={
+                    "input_ids": {0: "batch", 1: "sequence"},
+                    "attention_mask": {0: "batch", 1: "sequence"},
+                    "token_type_ids": {0: "batch", 1: "sequence"},
+                    "last_hidden_state": {0: "batch", 1: "sequence"},
+                },
+                opset_version=14,
+            )
+        os.replace(tmp_path, fp32_path)
+        tokenizer.save_pretrained(model_dir)
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        print(f"🗜️ Quantizing {model_name} to int8")
+        tmp_path = f"{int8_path}.tmp"
+        quantize_dynamic(fp32_path, tmp_path, weight_type=QuantType.QInt8)
+        os.replace(tmp_path, int8_path)
+    return target
+
+
+class OnnxEmbeddings(Embeddings):
+    """Sentence-transformers MiniLM run through ONNX Runtime on CPU.
+
+    Mean pooling over the attention mask and L2 normalization, as in the
+    model's sentence-transformers pipeline, so vectors match the PyTorch
+    backend (int8 within quantization error; see benchmark_embeddings.py).
+    """
+
+    def __init__(self, model_name: str, quantize: bool = False, batch_size: int = 64):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        self.model_name = model_name
+        self.quantize = quantize
+        self.batch_size = batch_size
+        model_path = export_onnx(model_name, quantize)
+        self.tokenizer = AutoTokenizer.from_pretrained(os.path.dirname(model_path))
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if EMBEDDING_ONNX_THREADS:
+            options.intra_op_num_threads = EMBEDDING_ONNX_THREADS
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self._inputs = {i.name for i in self.session.get_inputs()}
+        # The HF fast tokenizer is not safe to share between threads
+        self._tokenizer_lock = threading.Lock()
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        with self._tokenizer_lock:
+            batch = self.tokenizer(
+                texts,
+                padding=True,
+                truncation=True,
+                max_length=EMBEDDING_MAX_SEQ_LENGTH,
+                return_tensors="np",
+            )
+        feeds = {name: batch[name].astype(np.int64) for name in self._inputs if name in batch}
+        if "token_type_ids" in self._inputs and "token_type_ids" not in feeds:
+            feeds["token_type_ids"] = np.zeros_like(feeds["input_ids"])
+        hidden = self.session.run(None, feeds)[0]
+
+        mask = batch["attention_mask"][..., None].astype(np.float32)
+        pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        return pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        # Batch texts of similar length together to keep padding low
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        vectors = np.empty((len(texts), 0), dtype=np.float32)
+        for start in range(0, len(order), self.batch_size):
+            indices = order[start:start + self.batch_size]
+            encoded = self._encode([texts[i].replace("\n", " ") for i in indices])
+            if vectors.shape[1] == 0:
+                vectors = np.empty((len(texts), encoded.shape[1]), dtype=np.float32)
+            vectors[indices] = encoded
+        return vectors.tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
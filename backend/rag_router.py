@@ -1,16 +1,21 @@
 from typing import List, Tuple
 from langchain_core.documents import Document
-from vectorstore_setup import get_vectorstore, get_embedding_model
+from fastapi.concurrency import run_in_threadpool
+from vectorstore_setup import get_vectorstore, get_embedding_model, search_params_for
 from llm_utils import get_llm, get_rag_chain
 
 CONFIDENCE_THRESHOLD = 0.2
 
-def query_agent(qdrant_client, collection_name: str, question: str) -> Tuple[str, List[Document]]:
+async def aquery_agent(qdrant_client, async_qdrant_client, collection_name: str, question: str, search_filter=None) -> Tuple[str, List[Document]]:
+    """Answer from a collection without blocking: embedding in the thread pool, async Qdrant search and LLM call."""
     embedding_model = get_embedding_model()
-    question_embedding = embedding_model.embed_query(question)
+    question_embedding = await run_in_threadpool(embedding_model.embed_query, question)
 
-    vectorstore = get_vectorstore(qdrant_client, collection_name)
-    results = vectorstore.similarity_search_with_score_by_vector(question_embedding, k=4)
+    vectorstore = await run_in_threadpool(get_vectorstore, qdrant_client, collection_name, async_qdrant_client)
+    search_params = await run_in_threadpool(search_params_for, qdrant_client, collection_name)
+    results = await vectorstore.asimilarity_search_with_score_by_vector(
+        question_embedding, k=4, filter=search_filter, search_params=search_params
+    )
 
     if not results:
         return "No matching documents found.", []
@@ -25,8 +30,7 @@ def query_agent(qdrant_client, collection_name: str, question: str) -> Tuple[str
 
     llm = get_llm()
     rag_chain = get_rag_chain(llm, context, question)
-    answer = rag_chain.invoke({})
-
+    answer = await rag_chain.ainvoke({})
 
     return answer, docs
 def route_and_answer(question, qdrant_client, collection_names):
@@ -4,7 +4,7 @@ from typing import Dict
 from dotenv import load_dotenv
 from pydantic import BaseModel
 from fastapi import HTTPException
-from langchain_openai import ChatOpenAI
+from llm_utils import get_llm
 from langchain_core.prompts import PromptTemplate
 from langchain_core.output_parsers import StrOutputParser
 from langchain_community.utilities.sql_database import SQLDatabase
@@ -24,12 +24,8 @@ supabase = create_client(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_KEY"))
 OPENROUTER_KEY = os.getenv("OPENROUTER_API_KEY")
 assert OPENROUTER_KEY, "Missing OpenRouter API Key!"
 
-llm = ChatOpenAI(
-    model_name="mistralai/mistral-7b-instruct:free",
-    openai_api_base="https://openrouter.ai/api/v1",
-    openai_api_key=OPENROUTER_KEY,
-    temperature=0
-)
+# No max_tokens limit, as the searchbot had before it used the shared pool
+llm = get_llm(temperature=0, max_tokens=None, model="mistralai/mistral-7b-instruct:free")
 
 # Define state
 class GraphState(Dict):
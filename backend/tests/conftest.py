@@ -0,0 +1,19 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# Backend modules are imported flat, as when the app runs from backend/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Module-level stores (CHATBOT_GENERATIONS, DOCUMENT_STORE...) must not touch the real database
+os.environ.setdefault("PLUGMIND_DB_PATH", os.path.join(tempfile.mkdtemp(prefix="plugmind-tests-"), "plugmind.db"))
+
+
+@pytest.fixture
+def local_db(tmp_path, monkeypatch):
+    """A fresh SQLite database for stores created in the test."""
+    import local_db
+
+    monkeypatch.setattr(local_db, "DB_PATH", str(tmp_path / "plugmind.db"))
+    return local_db
@@ -0,0 +1,104 @@
+import os
+
+import numpy as np
+import pytest
+from langchain_core.documents import Document
+
+import document_store
+from document_store import DocumentStore, is_upload_path
+
+
+@pytest.fixture
+def store(local_db, tmp_path, monkeypatch):
+    # UPLOAD_DIR is relative to the working directory, as in the app
+    monkeypatch.chdir(tmp_path)
+    return DocumentStore()
+
+
+def test_identical_content_is_stored_once(store):
+    sha_a, path_a = store.save(b"same bytes", "a.pdf", "bot-1")
+    sha_b, path_b = store.save(b"same bytes", "b.pdf", "bot-2")
+
+    assert (sha_a, path_a) == (sha_b, path_b)
+    assert store.ref_count(sha_a) == 2
+    assert store.hash_for_path(path_a) == sha_a
+
+
+def test_file_is_removed_with_its_last_reference(store):
+    sha256, path = store.save(b"shared", "doc.pdf", "bot-1")
+    store.save(b"shared", "doc.pdf", "bot-2")
+    store.save_chunks(sha256, "model-a:1000:200", [Document(page_content="x", metadata={})], [[1.0, 0.0]])
+    store.save_chunks(sha256, "model-b:1000:200", [Document(page_content="x", metadata={})], [[0.0, 1.0]])
+
+    assert store.release("bot-1", path) is False
+    assert os.path.exists(path)
+
+    assert store.release("bot-2", path) is True
+    assert not os.path.exists(path)
+    assert store.hash_for_path(path) is None
+    assert os.listdir(document_store.CHUNK_CACHE_DIR) == []
+
+
+def test_release_by_a_chatbot_without_a_reference_keeps_the_file(store):
+    _, path = store.save(b"mine", "doc.pdf", "bot-1")
+
+    store.release("bot-2", path)
+
+    assert os.path.exists(path)
+
+
+def test_legacy_upload_is_deleted_on_release(store):
+    os.makedirs(document_store.UPLOAD_DIR, exist_ok=True)
+    path = os.path.join(document_store.UPLOAD_DIR, "legacy.pdf")
+    with open(path, "wb") as f:
+        f.write(b"old")
+
+    assert store.release("bot-1", path) is True
+    assert not os.path.exists(path)
+
+
+@pytest.mark.parametrize("relative", ["../outside.txt", "uploaded_pdfs/../outside.txt"])
+def test_paths_outside_the_upload_dir_are_never_deleted(store, tmp_path, relative):
+    os.makedirs(document_store.UPLOAD_DIR, exist_ok=True)
+    outside = tmp_path / "outside.txt"
+    outside.write_text("keep me")
+    path = os.path.join(document_store.UPLOAD_DIR, relative) if relative.startswith("..") else relative
+
+    assert not is_upload_path(path)
+    assert store.release("bot-1", path) is False
+    assert outside.exists()
+
+
+def test_move_refs_hands_uploads_over(store):
+    sha256, path = store.save(b"new bot", "doc.pdf", "upload:123")
+
+    store.move_refs("upload:123", "bot-9")
+    store.release("upload:123", path)
+
+    assert os.path.exists(path)
+    assert store.ref_count(sha256) == 1
+    assert store.release("bot-9", path) is True
+
+
+def test_chunk_cache_is_per_variant(store):
+    sha256, _ = store.save(b"chunks", "doc.pdf", "bot-1")
+    chunks = [Document(page_content="one", metadata={"page": 1}), Document(page_content="two", metadata={"page": 2})]
+    store.save_chunks(sha256, "model-a:1000:200", chunks, np.eye(2))
+
+    cached_chunks, vectors = store.load_chunks(sha256, "model-a:1000:200")
+    assert [c.page_content for c in cached_chunks] == ["one", "two"]
+    assert cached_chunks[1].metadata == {"page": 2}
+    assert vectors.tolist() == [[1.0, 0.0], [0.0, 1.0]]
+    assert store.load_chunks(sha256, "model-b:1000:200") is None
+    assert store.load_chunks(sha256, "model-a:500:100") is None
+
+
+def test_indexed_documents_are_recorded_per_chatbot(store):
+    assert store.indexed_points("bot-1", "doc") is None
+
+    store.mark_indexed("bot-1", "doc", 12)
+    store.mark_indexed("bot-2", "doc", 3)
+    store.forget_indexed("bot-2")
+
+    assert store.indexed_points("bot-1", "doc") == 12
+    assert store.indexed_points("bot-2", "doc") is None
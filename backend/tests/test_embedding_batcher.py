@@ -0,0 +1,131 @@
+import threading
+import time
+
+import pytest
+
+from embedding_batcher import QueryBatcher
+from langchain_core.embeddings import Embeddings
+
+
+class StubEmbeddings(Embeddings):
+    """Vector [len(text), batch number]; can be held back or made to fail."""
+
+    def __init__(self):
+        self.batches = []
+        self.release = threading.Event()
+        self.release.set()
+        self.error = None
+
+    def embed_documents(self, texts):
+        self.release.wait(5)
+        if self.error:
+            raise self.error
+        self.batches.append(list(texts))
+        return [[float(len(text)), float(len(self.batches))] for text in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+def run_concurrently(fn, args):
+    results, errors = {}, {}
+
+    def call(arg):
+        try:
+            results[arg] = fn(arg)
+        except Exception as e:
+            errors[arg] = e
+
+    threads = [threading.Thread(target=call, args=(arg,)) for arg in args]
+    for thread in threads:
+        thread.start()
+    return threads, results, errors
+
+
+def join(threads):
+    for thread in threads:
+        thread.join(5)
+        assert not thread.is_alive()
+
+
+def test_concurrent_queries_share_batches_and_get_their_own_vector():
+    model = StubEmbeddings()
+    batcher = QueryBatcher(model, max_size=8, max_wait_ms=50)
+    texts = ["x" * n for n in range(1, 21)]
+
+    threads, results, errors = run_concurrently(batcher.embed_query, texts)
+    join(threads)
+
+    assert not errors
+    assert {text: vector[0] for text, vector in results.items()} == {text: len(text) for text in texts}
+    assert len(model.batches) < len(texts)
+    assert max(len(batch) for batch in model.batches) <= 8
+    stats = batcher.stats()
+    assert stats["queries"] == 20
+    assert stats["batches"] == len(model.batches)
+    assert stats["largest_batch"] <= 8
+
+
+def test_single_query_is_not_held_longer_than_max_wait():
+    batcher = QueryBatcher(StubEmbeddings(), max_wait_ms=20)
+    started = time.monotonic()
+    assert batcher.embed_query("hello")[0] == 5
+    assert time.monotonic() - started < 1
+
+
+def test_encoder_error_reaches_every_caller_of_the_batch():
+    model = StubEmbeddings()
+    model.release.clear()
+    model.error = RuntimeError("model crashed")
+    batcher = QueryBatcher(model, max_size=16, max_wait_ms=100)
+
+    threads, results, errors = run_concurrently(batcher.embed_query, [f"q{i}" for i in range(5)])
+    time.sleep(0.2)
+    model.release.set()
+    join(threads)
+
+    assert not results
+    assert len(errors) == 5
+    assert all(str(e) == "model crashed" for e in errors.values())
+
+    # The worker survives a failed batch
+    model.error = None
+    assert batcher.embed_query("again")[0] == 5
+
+
+def test_queue_is_bounded():
+    model = StubEmbeddings()
+    model.release.clear()
+    # One query per batch: the first one is held in the model, the rest queue up
+    batcher = QueryBatcher(model, max_size=1, max_wait_ms=0, max_queue=2)
+
+    threads, results, errors = run_concurrently(batcher.embed_query, [f"q{i}" for i in range(5)])
+    time.sleep(0.2)
+    assert batcher.stats()["queue_depth"] == 2
+
+    model.release.set()
+    join(threads)
+    assert not errors
+    assert len(results) == 5
+
+
+def test_documents_bypass_the_queue():
+    model = StubEmbeddings()
+    batcher = QueryBatcher(model)
+
+    assert batcher.embed_documents(["a", "bb"]) == [[1.0, 1.0], [2.0, 1.0]]
+    assert batcher.stats()["queries"] == 0
+
+
+def test_custom_encoder_is_used_for_queries():
+    model = StubEmbeddings()
+    batcher = QueryBatcher(model, encode=lambda texts: [[-1.0] for _ in texts])
+
+    assert batcher.embed_queries(["a", "b"]) == [[-1.0], [-1.0]]
+    assert model.batches == []
+
+
+@pytest.mark.parametrize("count", [0, 1])
+def test_embed_queries_handles_small_inputs(count):
+    batcher = QueryBatcher(StubEmbeddings())
+    assert len(batcher.embed_queries(["abc"] * count)) == count
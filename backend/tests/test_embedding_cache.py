@@ -0,0 +1,69 @@
+from embedding_cache import CachedEmbeddings, EmbeddingCacheStore
+from langchain_core.embeddings import Embeddings
+
+
+class CountingEmbeddings(Embeddings):
+    def __init__(self):
+        self.documents = 0
+        self.queries = 0
+
+    def embed_documents(self, texts):
+        self.documents += len(texts)
+        return [[float(len(text)), 1.0] for text in texts]
+
+    def embed_query(self, text):
+        self.queries += 1
+        return [float(len(text)), 2.0]
+
+
+def backdate(store, key, last_used):
+    with store._conn:
+        store._conn.execute("UPDATE entries SET last_used = ? WHERE key = ?", (last_used, key))
+
+
+def test_documents_are_embedded_once(tmp_path):
+    base = CountingEmbeddings()
+    cached = CachedEmbeddings(base, "model", dim=2, cache_dir=str(tmp_path))
+
+    assert cached.embed_documents(["a", "bb", "a"]) == [[1.0, 1.0], [2.0, 1.0], [1.0, 1.0]]
+    assert cached.embed_documents(["bb"]) == [[2.0, 1.0]]
+
+    assert base.documents == 2
+    assert cached.stats()["hits"] == 1
+
+
+def test_queries_are_not_cached_on_disk(tmp_path):
+    base = CountingEmbeddings()
+    cached = CachedEmbeddings(base, "model", dim=2, cache_dir=str(tmp_path))
+
+    assert cached.embed_query("hello") == [5.0, 2.0]
+    assert cached.embed_query("hello") == [5.0, 2.0]
+
+    assert base.queries == 2
+    assert len(cached.store) == 0
+
+
+def test_recent_hits_do_not_rewrite_last_used(tmp_path):
+    store = EmbeddingCacheStore("model", dim=2, cache_dir=str(tmp_path))
+    store.put_many({"k": [1.0, 2.0]})
+    backdate(store, "k", 0)
+
+    assert store.get_many(["k"])["k"].tolist() == [1.0, 2.0]
+    touched = store._conn.execute("SELECT last_used FROM entries").fetchone()[0]
+    assert touched > 0
+
+    store.get_many(["k"])
+    assert store._conn.execute("SELECT last_used FROM entries").fetchone()[0] == touched
+
+
+def test_least_recently_used_entry_is_evicted(tmp_path):
+    # Room for two 2-dim vectors
+    store = EmbeddingCacheStore("model", dim=2, max_mb=16 / (1024 * 1024), cache_dir=str(tmp_path))
+    store.put_many({"old": [1.0, 0.0]})
+    store.put_many({"new": [0.0, 1.0]})
+    backdate(store, "old", 1)
+
+    store.put_many({"newer": [1.0, 1.0]})
+
+    assert set(store.get_many(["old", "new", "newer"])) == {"new", "newer"}
+    assert store.evictions == 1
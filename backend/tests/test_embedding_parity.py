@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("onnxruntime")
+pytest.importorskip("sentence_transformers")
+pytest.importorskip("transformers")
+pytest.importorskip("langchain_community")
+
+from benchmark_embeddings import MAX_COSINE_DELTA, QUERIES, cosine_scores, sample_passages
+
+MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+PASSAGES = sample_passages(50)
+
+
+def _scores(model) -> np.ndarray:
+    return cosine_scores(
+        np.array([model.embed_query(q) for q in QUERIES]),
+        np.array(model.embed_documents(PASSAGES))
+    )
+
+
+@pytest.fixture(scope="module")
+def reference_scores():
+    from langchain_community.embeddings import HuggingFaceEmbeddings
+
+    try:
+        model = HuggingFaceEmbeddings(model_name=MODEL_NAME)
+    except Exception as e:
+        pytest.skip(f"{MODEL_NAME} not available: {e}")
+    return _scores(model)
+
+
+@pytest.mark.parametrize("quantize", [False, True], ids=["onnx", "onnx-int8"])
+def test_onnx_cosine_scores_match_torch(reference_scores, quantize):
+    from onnx_embeddings import OnnxEmbeddings, export_onnx
+
+    try:
+        export_onnx(MODEL_NAME, quantize=quantize)
+    except Exception as e:
+        pytest.skip(f"Could not export {MODEL_NAME} to ONNX: {e}")
+    scores = _scores(OnnxEmbeddings(MODEL_NAME, quantize=quantize))
+
+    assert np.abs(scores - reference_scores).max() <= MAX_COSINE_DELTA
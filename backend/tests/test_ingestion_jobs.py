@@ -0,0 +1,42 @@
+from ingestion_jobs import IngestionJobStore
+
+
+def test_newer_job_supersedes_queued_ones(local_db):
+    store = IngestionJobStore()
+    first = store.create("bot-1", "user", "update", {"files": ["a.pdf"], "rebuild": True})
+    other = store.create("bot-2", "user", "update", {"files": []})
+
+    latest = store.create("bot-1", "user", "update", {"files": ["a.pdf", "b.pdf"]})
+
+    assert store.get(first["id"])["status"] == "superseded"
+    assert store.get(other["id"])["status"] == "queued"
+    # The rebuild asked for by the dropped job is not lost
+    assert latest["payload"] == {"files": ["a.pdf", "b.pdf"], "rebuild": True}
+
+
+def test_one_running_job_per_chatbot(local_db):
+    store = IngestionJobStore()
+    running = store.create("bot-1", "user", "create", {"files": []})
+    assert store.claim(running["id"])
+    waiting = store.create("bot-1", "user", "update", {"files": []})
+    elsewhere = store.create("bot-2", "user", "create", {"files": []})
+
+    assert not store.claim(waiting["id"])
+    assert store.claim(elsewhere["id"])
+
+    store.finish(running["id"], "completed")
+    assert store.next_queued("bot-1") == waiting["id"]
+    assert store.claim(waiting["id"])
+
+
+def test_create_if_idle_skips_busy_chatbots(local_db):
+    store = IngestionJobStore()
+    busy = store.create("bot-1", "user", "update", {"files": []})
+
+    assert store.create_if_idle("bot-1", "user", "refresh", {"web_only": True}) is None
+    store.claim(busy["id"])
+    assert store.create_if_idle("bot-1", "user", "refresh", {"web_only": True}) is None
+
+    store.finish(busy["id"], "completed")
+    job = store.create_if_idle("bot-1", "user", "refresh", {"web_only": True})
+    assert job["status"] == "queued"
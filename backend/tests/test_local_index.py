@@ -0,0 +1,110 @@
+import sys
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from local_index import LocalIndex
+
+
+class StubGenerations:
+    def __init__(self):
+        self.values = {}
+
+    def get(self, chatbot_id):
+        return self.values.get(str(chatbot_id), 0)
+
+
+class StubQdrant:
+    """count() and scroll() over a fixed list of (vector, text) points."""
+
+    def __init__(self, points):
+        self.points = [
+            SimpleNamespace(vector=vector, payload={"page_content": text, "metadata": {"n": i}})
+            for i, (vector, text) in enumerate(points)
+        ]
+
+    def count(self, **kwargs):
+        return SimpleNamespace(count=len(self.points))
+
+    def scroll(self, limit, offset=None, **kwargs):
+        start = offset or 0
+        end = start + limit
+        return self.points[start:end], (end if end < len(self.points) else None)
+
+
+def placement(chatbot_id="bot-1"):
+    return SimpleNamespace(chatbot_id=chatbot_id, collection_name="shared_chatbots_0", points_filter=lambda: None)
+
+
+@pytest.fixture
+def qdrant(monkeypatch):
+    client = StubQdrant([
+        ([1.0, 0.0, 0.0], "east"),
+        ([0.0, 1.0, 0.0], "north"),
+        ([0.7, 0.7, 0.0], "north-east"),
+        ([-1.0, 0.0, 0.0], "west"),
+    ])
+    monkeypatch.setitem(sys.modules, "vectorstore_setup", SimpleNamespace(get_qdrant_client=lambda: client))
+    return client
+
+
+@pytest.fixture
+def index(tmp_path):
+    return LocalIndex(str(tmp_path), generations=StubGenerations())
+
+
+def test_results_are_ranked_by_cosine(qdrant, index):
+    assert index.load(placement())
+
+    results = index.search(placement(), [2.0, 0.2, 0.0], k=3)
+
+    assert [doc.page_content for doc, _ in results] == ["east", "north-east", "north"]
+    scores = [score for _, score in results]
+    assert scores == sorted(scores, reverse=True)
+    assert scores[0] == pytest.approx(2.0 / np.linalg.norm([2.0, 0.2]), rel=1e-5)
+    assert results[0][0].metadata == {"n": 0}
+
+
+def test_score_threshold_cuts_the_results(qdrant, index):
+    index.load(placement())
+
+    results = index.search(placement(), [1.0, 0.0, 0.0], k=4, score_threshold=0.5)
+
+    assert [doc.page_content for doc, _ in results] == ["east", "north-east"]
+
+
+def test_k_larger_than_the_chatbot(qdrant, index):
+    index.load(placement())
+
+    assert len(index.search(placement(), [0.0, 0.0, 1.0], k=10)) == 4
+
+
+def test_cold_chatbot_goes_to_qdrant(index):
+    assert index.search(placement("unknown"), [1.0, 0.0, 0.0]) is None
+    assert index.stats()["misses"] == 1
+
+
+def test_copy_from_an_older_generation_is_not_served(qdrant, index, monkeypatch):
+    index.load(placement())
+    reloads = []
+    monkeypatch.setattr(index, "_start_load", lambda p: reloads.append(p.chatbot_id))
+
+    index.generations.values["bot-1"] = 1
+
+    assert index.search(placement(), [1.0, 0.0, 0.0]) is None
+    assert reloads == ["bot-1"]
+
+
+def test_too_large_chatbot_is_not_loaded(qdrant, index, monkeypatch):
+    monkeypatch.setattr("local_index.LOCAL_INDEX_MAX_POINTS", 2)
+
+    assert index.load(placement()) is False
+    assert index.search(placement(), [1.0, 0.0, 0.0]) is None
+
+
+def test_empty_chatbot(monkeypatch, index):
+    monkeypatch.setitem(sys.modules, "vectorstore_setup", SimpleNamespace(get_qdrant_client=lambda: StubQdrant([])))
+
+    assert index.load(placement())
+    assert index.search(placement(), [1.0, 0.0, 0.0]) == []
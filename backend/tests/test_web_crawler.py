@@ -0,0 +1,37 @@
+import asyncio
+import functools
+
+import httpx
+
+import web_crawler
+from web_crawler import WebsiteCrawler
+
+# The site moved to https; its sitemap still lists the http URLs
+SITE = {
+    "https://example.com/": '<a href="https://example.com/about">About</a>',
+    "https://example.com/about": "<title>About</title><p>We make lamps.</p>",
+    "https://example.com/sitemap.xml": (
+        '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">'
+        "<url><loc>http://example.com/about</loc></url></urlset>"
+    ),
+}
+
+
+def serve(request):
+    url = str(request.url)
+    if url.startswith("http://"):
+        return httpx.Response(301, headers={"location": "https://" + url[len("http://"):]})
+    if url in SITE:
+        return httpx.Response(200, text=SITE[url], headers={"content-type": "text/html"})
+    return httpx.Response(404)
+
+
+def test_page_reached_through_a_redirect_is_indexed_once(monkeypatch):
+    client = functools.partial(httpx.AsyncClient, transport=httpx.MockTransport(serve))
+    monkeypatch.setattr(web_crawler.httpx, "AsyncClient", client)
+    crawler = WebsiteCrawler("http://example.com/", limit_pages=10, concurrency=1)
+
+    chunks = asyncio.run(crawler.crawl())
+
+    assert sorted(c.metadata["url"] for c in chunks) == ["https://example.com/", "https://example.com/about"]
+    assert set(crawler.pages) == {"https://example.com/", "https://example.com/about"}
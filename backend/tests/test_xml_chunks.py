@@ -0,0 +1,91 @@
+import pytest
+
+from document_loader import iter_xml_chunks, load_and_split_xml, parse_files_parallel
+
+
+def write(tmp_path, xml: str):
+    path = tmp_path / "feed.xml"
+    path.write_text(xml, encoding="utf-8")
+    return str(path)
+
+
+CATALOG = """<?xml version="1.0"?>
+<catalog xmlns="http://example.com/catalog">
+  <product><name>Lamp</name><price>20</price></product>
+  <product><name>Desk</name><price>150</price></product>
+  <product><name>Chair</name><price>80</price></product>
+</catalog>
+"""
+
+
+def test_small_records_are_packed_into_one_chunk(tmp_path):
+    chunks = list(iter_xml_chunks(write(tmp_path, CATALOG), chunk_size=1000, chunk_overlap=0))
+
+    assert len(chunks) == 1
+    text = chunks[0].page_content
+    assert "name: Lamp\nprice: 20" in text
+    assert text.index("Lamp") < text.index("Desk") < text.index("Chair")
+    # Namespaces are dropped from the path
+    assert chunks[0].metadata == {"source": "feed.xml", "xml_path": "/catalog/product"}
+
+
+def test_records_are_split_at_chunk_size(tmp_path):
+    chunks = list(iter_xml_chunks(write(tmp_path, CATALOG), chunk_size=30, chunk_overlap=0))
+
+    assert [c.page_content for c in chunks] == [
+        "name: Lamp\nprice: 20",
+        "name: Desk\nprice: 150",
+        "name: Chair\nprice: 80",
+    ]
+
+
+def test_paths_of_mixed_records_fall_back_to_their_common_parent(tmp_path):
+    xml = "<shop><books><book><title>A</title></book></books><films><film><title>B</title></film></films></shop>"
+
+    chunks = list(iter_xml_chunks(write(tmp_path, xml), chunk_size=1000, chunk_overlap=0))
+
+    assert len(chunks) == 1
+    assert chunks[0].metadata["xml_path"] == "/shop"
+
+
+def test_very_flat_element_is_emitted_in_pieces(tmp_path):
+    fields = "".join(f"<field{i}>{'v' * 20}</field{i}>" for i in range(150))
+    xml = f"<root><record>{fields}</record></root>"
+
+    chunks = list(iter_xml_chunks(write(tmp_path, xml), chunk_size=1000, chunk_overlap=0))
+
+    assert len(chunks) > 1
+    assert all(c.metadata["xml_path"] == "/root/record" for c in chunks)
+    assert all(len(c.page_content) <= 1000 for c in chunks)
+    assert chunks[0].page_content.startswith("field0: ")
+    assert chunks[-1].page_content.endswith("field149: " + "v" * 20)
+
+
+def test_container_text_leads_its_group(tmp_path):
+    xml = "<root><note>Intro<author>Ann</author></note></root>"
+
+    chunks = list(iter_xml_chunks(write(tmp_path, xml), chunk_size=1000, chunk_overlap=0))
+
+    assert chunks[0].page_content == "Intro\nauthor: Ann"
+
+
+@pytest.mark.parametrize("xml", ["<root><unclosed></root>", ""])
+def test_invalid_xml_gives_no_chunks(tmp_path, xml):
+    assert load_and_split_xml(write(tmp_path, xml)) == []
+
+
+def test_xml_is_streamed_in_batches(tmp_path):
+    path = write(tmp_path, CATALOG)
+
+    pieces = list(parse_files_parallel([path], chunk_size=30, chunk_overlap=0, xml_batch_size=2))
+
+    assert [(len(chunks), file_done, error) for _, chunks, file_done, error in pieces] == [(2, False, None), (1, True, None)]
+
+
+def test_xml_parse_error_reaches_the_caller(tmp_path):
+    path = write(tmp_path, "<root><unclosed></root>")
+
+    [(piece_path, chunks, file_done, error)] = parse_files_parallel([path])
+
+    assert (piece_path, chunks, file_done) == (path, [], True)
+    assert error.startswith(f"Failed to load and split {path}")
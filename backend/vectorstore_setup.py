@@ -1,61 +1,456 @@
+import asyncio
 import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional
+import httpx
 from dotenv import load_dotenv
-from qdrant_client import QdrantClient
-from qdrant_client.models import Distance, VectorParams
+from qdrant_client import QdrantClient, AsyncQdrantClient
+from qdrant_client.models import (
+    Distance,
+    HnswConfigDiff,
+    OptimizersConfigDiff,
+    QuantizationSearchParams,
+    ScalarQuantization,
+    ScalarQuantizationConfig,
+    ScalarType,
+    SearchParams,
+    VectorParams,
+    WalConfigDiff,
+)
 from langchain_community.vectorstores import Qdrant
-from langchain_community.embeddings import HuggingFaceEmbeddings
 import logging
+from embedding_cache import CachedEmbeddings, QueryEmbeddingLRU
+from embedding_batcher import QueryBatcher, EMBED_BATCHING_ENABLED
+from embedding_service import EMBEDDING_SERVICE_URL, LazyEmbeddings, RemoteEmbeddings
+from embedding_models import COLLECTION_DIMENSIONS, EMBEDDING_CACHE_MODEL, build_embeddings
+from local_db import get_connection
 
 # Load environment variables
 load_dotenv()
 
-# Initialize embedding model once (caching)
-EMBEDDINGS = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
+# With a shared embedding server the model is only loaded here if the server is down
+EMBEDDING_SERVICE = None
+if EMBEDDING_SERVICE_URL:
+    EMBEDDING_SERVICE = RemoteEmbeddings(EMBEDDING_SERVICE_URL, EMBEDDING_CACHE_MODEL, LazyEmbeddings(build_embeddings))
+    EMBEDDINGS = EMBEDDING_SERVICE
+else:
+    EMBEDDINGS = build_embeddings()
 
-# Set embedding dimensions based on model
-COLLECTION_DIMENSIONS = 384  # for MiniLM-L6
+# Concurrent cache-missing questions share one forward pass (or one request to the server)
+QUERY_BATCHER = None
+if EMBED_BATCHING_ENABLED:
+    QUERY_BATCHER = QueryBatcher(EMBEDDINGS, encode=EMBEDDING_SERVICE.embed_queries if EMBEDDING_SERVICE else None)
+    EMBEDDINGS = QUERY_BATCHER
 
-def get_qdrant_client() -> QdrantClient:
-    try:
-        client = QdrantClient(
+# Persistent (model, text) -> vector cache in front of the model
+EMBEDDING_CACHE = None
+if os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() in ("1", "true", "yes"):
+    EMBEDDING_CACHE = CachedEmbeddings(EMBEDDINGS, EMBEDDING_CACHE_MODEL, COLLECTION_DIMENSIONS)
+    EMBEDDINGS = EMBEDDING_CACHE
+
+# Repeated questions skip the model entirely
+QUERY_EMBEDDING_CACHE = QueryEmbeddingLRU(EMBEDDINGS, EMBEDDING_CACHE_MODEL)
+EMBEDDINGS = QUERY_EMBEDDING_CACHE
+
+QDRANT_PREFER_GRPC = os.getenv("QDRANT_PREFER_GRPC", "false").lower() in ("1", "true", "yes")
+QDRANT_POOL_SIZE = int(os.getenv("QDRANT_POOL_SIZE", "32"))
+QDRANT_HEALTHCHECK_INTERVAL = float(os.getenv("QDRANT_HEALTHCHECK_INTERVAL", "30"))
+# Seconds a replaced async client stays open for the searches still using it
+QDRANT_ASYNC_CLOSE_GRACE = float(os.getenv("QDRANT_ASYNC_CLOSE_GRACE", "30"))
+
+
+class QdrantClientRegistry:
+    """Holds the single QdrantClient shared by every request in this process.
+
+    The client keeps a pool of keep-alive connections, so requests no longer
+    pay for a fresh connection and a get_collections() probe each time.
+    A background thread pings the server and reconnects when it goes away.
+    """
+
+    def __init__(self):
+        self._client = None
+        self._async_client = None
+        # Event loop the async client was created on (and has to be closed on)
+        self._async_loop = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.healthy = False
+        self.last_error = None
+
+    def _connect_args(self) -> dict:
+        return dict(
             url=os.getenv("QDRANT_URL"),
             api_key=os.getenv("QDRANT_API_KEY"),
-            prefer_grpc=False,
-            timeout=300  # 5 minute timeout
+            prefer_grpc=QDRANT_PREFER_GRPC,
+            timeout=300,  # 5 minute timeout
+            limits=httpx.Limits(
+                max_connections=QDRANT_POOL_SIZE,
+                max_keepalive_connections=QDRANT_POOL_SIZE
+            )
         )
-        # Test connection
-        client.get_collections()
-        return client
+
+    def _connect(self) -> QdrantClient:
+        return QdrantClient(**self._connect_args())
+
+    def get_client(self) -> QdrantClient:
+        if self._client is not None:
+            return self._client
+        with self._lock:
+            if self._client is None:
+                self.reconnect()
+        return self._client
+
+    def get_async_client(self) -> AsyncQdrantClient:
+        """Async twin of get_client() for the event-loop side of the app."""
+        if self._async_client is None:
+            with self._lock:
+                if self._async_client is None:
+                    try:
+                        self._async_loop = asyncio.get_running_loop()
+                    except RuntimeError:
+                        self._async_loop = None
+                    self._async_client = AsyncQdrantClient(**self._connect_args())
+        return self._async_client
+
+    def reconnect(self):
+        """Build a new client, check it and swap it in for the old one."""
+        client = self._connect()
+        # Cheap call that does not list every collection
+        client.get_locks()
+        old, self._client = self._client, client
+        # Rebuilt lazily on next use
+        old_async, old_loop = self._async_client, self._async_loop
+        self._async_client = None
+        self._async_loop = None
+        self.healthy = True
+        self.last_error = None
+        if old is not None:
+            try:
+                old.close()
+            except Exception:
+                pass
+        if old_async is not None:
+            self._close_async(old_async, old_loop)
+
+    @staticmethod
+    def _close_async(client: AsyncQdrantClient, loop, grace: float = QDRANT_ASYNC_CLOSE_GRACE):
+        """Close a replaced async client on its own loop, once in-flight calls had time to finish."""
+        async def close_later():
+            await asyncio.sleep(grace)
+            await client.close()
+
+        try:
+            if loop is not None and loop.is_running():
+                asyncio.run_coroutine_threadsafe(close_later(), loop)
+            else:
+                asyncio.run(client.close())
+        except Exception as e:
+            logging.warning(f"Could not close replaced async Qdrant client: {str(e)}")
+
+    def check_health(self) -> bool:
+        try:
+            self.get_client().get_locks()
+            self.healthy = True
+        except Exception as e:
+            self.healthy = False
+            self.last_error = str(e)
+            logging.warning(f"Qdrant health check failed, reconnecting: {str(e)}")
+            try:
+                with self._lock:
+                    self.reconnect()
+            except Exception as e:
+                self.last_error = str(e)
+                logging.error(f"Qdrant reconnect failed: {str(e)}")
+        return self.healthy
+
+    def _health_loop(self):
+        while not self._stop.wait(QDRANT_HEALTHCHECK_INTERVAL):
+            self.check_health()
+
+    def start(self):
+        """Connect eagerly and start the background health check (app startup)."""
+        try:
+            self.get_client()
+        except Exception as e:
+            # Keep the app up, the health loop will retry
+            self.last_error = str(e)
+            logging.error(f"Failed to connect to Qdrant: {str(e)}")
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._health_loop, name="qdrant-health", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        with self._lock:
+            if self._client is not None:
+                try:
+                    self._client.close()
+                except Exception:
+                    pass
+                self._client = None
+            if self._async_client is not None:
+                self._close_async(self._async_client, self._async_loop, grace=0)
+            self._async_client = None
+            self._async_loop = None
+        self.healthy = False
+
+
+QDRANT_REGISTRY = QdrantClientRegistry()
+
+def get_qdrant_client() -> QdrantClient:
+    try:
+        return QDRANT_REGISTRY.get_client()
     except Exception as e:
         logging.error(f"Failed to connect to Qdrant: {str(e)}")
         raise RuntimeError(f"Failed to connect to Qdrant: {str(e)}")
 
+def get_async_qdrant_client() -> AsyncQdrantClient:
+    return QDRANT_REGISTRY.get_async_client()
+
+COLLECTION_REGISTRY_TTL = float(os.getenv("COLLECTION_REGISTRY_TTL", "300"))
+
+
+class CollectionRegistry:
+    """In-process set of collection names for O(1) existence checks.
+
+    Seeded from a single get_collections() call and resynced every
+    COLLECTION_REGISTRY_TTL seconds. Creates and deletes made by this
+    process are applied immediately with add()/discard().
+    """
+
+    def __init__(self, ttl: float = COLLECTION_REGISTRY_TTL):
+        self.ttl = ttl
+        self._names = set()
+        self._touched = {}
+        self._synced_at = None
+        self._lock = threading.Lock()
+
+    def sync(self, client: QdrantClient):
+        started = time.monotonic()
+        listed = {collection.name for collection in client.get_collections().collections}
+        # Aliases (blue/green chatbot collections) are used exactly like collection names
+        listed.update(alias.alias_name for alias in client.get_aliases().aliases)
+        with self._lock:
+            # Keep local changes made while the listing was in flight
+            for name, touched_at in self._touched.items():
+                if touched_at >= started:
+                    if name in self._names:
+                        listed.add(name)
+                    else:
+                        listed.discard(name)
+            self._names = listed
+            self._touched = {n: t for n, t in self._touched.items() if t >= started}
+            self._synced_at = started
+
+    def _is_stale(self) -> bool:
+        return self._synced_at is None or time.monotonic() - self._synced_at > self.ttl
+
+    def exists(self, client: QdrantClient, collection_name: str) -> bool:
+        if self._is_stale():
+            self.sync(client)
+        if collection_name in self._names:
+            return True
+        # Another worker may have created it since our last sync
+        try:
+            client.get_collection(collection_name)
+        except Exception:
+            return False
+        self.add(collection_name)
+        return True
+
+    def add(self, collection_name: str):
+        with self._lock:
+            self._names.add(collection_name)
+            self._touched[collection_name] = time.monotonic()
+
+    def discard(self, collection_name: str):
+        with self._lock:
+            self._names.discard(collection_name)
+            self._touched[collection_name] = time.monotonic()
+
+
+COLLECTION_REGISTRY = CollectionRegistry()
+
+@dataclass(frozen=True)
+class CollectionProfile:
+    """How a collection is built and searched, for a given expected size."""
+    name: str
+    max_points: float
+    m: int
+    ef_construct: int
+    # hnsw_ef at search time
+    ef: int
+    # int8 scalar quantization (kept in RAM), searched with rescoring on the originals
+    quantize: bool
+    # Original float32 vectors memory-mapped from disk instead of held in RAM
+    on_disk: bool
+    oversampling: float = 1.0
+
+
+# Smallest profile whose max_points covers the expected collection size wins
+COLLECTION_PROFILES = (
+    CollectionProfile("small", 10_000, m=16, ef_construct=100, ef=64, quantize=False, on_disk=False),
+    CollectionProfile("medium", 200_000, m=16, ef_construct=128, ef=96, quantize=True, on_disk=True, oversampling=1.5),
+    CollectionProfile("large", float("inf"), m=32, ef_construct=256, ef=128, quantize=True, on_disk=True, oversampling=2.0),
+)
+# Force one profile for every new collection ("auto" picks by expected size)
+COLLECTION_PROFILE = os.getenv("COLLECTION_PROFILE", "auto").lower()
+
+
+def profile_for(expected_points: int = 0) -> CollectionProfile:
+    if COLLECTION_PROFILE != "auto":
+        for profile in COLLECTION_PROFILES:
+            if profile.name == COLLECTION_PROFILE:
+                return profile
+        raise ValueError(f"Unknown COLLECTION_PROFILE: {COLLECTION_PROFILE}")
+    for profile in COLLECTION_PROFILES:
+        if expected_points <= profile.max_points:
+            return profile
+    return COLLECTION_PROFILES[-1]
+
+
+class ProvisionedProfiles:
+    """Profile each collection was created with, shared by all worker processes.
+
+    Qdrant's own defaults (m=16, ef_construct=100) are indistinguishable from
+    the small profile, so the profile is recorded at creation instead of
+    being guessed from the HNSW config. Collections without a record were
+    created before profiles and are searched with Qdrant's defaults.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._conn = get_connection()
+        with self._lock, self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS collection_profiles (
+                    collection_name TEXT PRIMARY KEY,
+                    profile TEXT NOT NULL
+                )
+            """)
+
+    def record(self, collection_name: str, profile: CollectionProfile):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO collection_profiles (collection_name, profile) VALUES (?, ?)",
+                (collection_name, profile.name)
+            )
+
+    def get(self, collection_name: str) -> Optional[CollectionProfile]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT profile FROM collection_profiles WHERE collection_name = ?", (collection_name,)
+            ).fetchone()
+        if row is None:
+            return None
+        return next((profile for profile in COLLECTION_PROFILES if profile.name == row["profile"]), None)
+
+    def forget(self, collection_name: str):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM collection_profiles WHERE collection_name = ?", (collection_name,))
+
+
+PROVISIONED_PROFILES = ProvisionedProfiles()
+
+
+def provision_collection(client: QdrantClient, collection_name: str, expected_points: int = 0,
+                         profile: CollectionProfile = None, shared: bool = False) -> CollectionProfile:
+    """Create a collection from a profile, unless it already exists.
+
+    The one place collections are created: chatbot collections and their
+    versions, pooled (shared) collections, and get_vectorstore's fallback.
+    Pooled collections get per-tenant graphs (payload_m) instead of a
+    global one.
+    """
+    profile = profile or profile_for(expected_points)
+    if COLLECTION_REGISTRY.exists(client, collection_name):
+        return profile
+    client.create_collection(
+        collection_name=collection_name,
+        vectors_config=VectorParams(
+            size=COLLECTION_DIMENSIONS,
+            distance=Distance.COSINE,
+            on_disk=profile.on_disk
+        ),
+        hnsw_config=HnswConfigDiff(
+            m=0 if shared else profile.m,
+            payload_m=profile.m if shared else None,
+            ef_construct=profile.ef_construct
+        ),
+        quantization_config=ScalarQuantization(
+            scalar=ScalarQuantizationConfig(type=ScalarType.INT8, quantile=0.99, always_ram=True)
+        ) if profile.quantize else None,
+        optimizers_config=OptimizersConfigDiff(
+            default_segment_number=2,
+            max_optimization_threads=4,
+            memmap_threshold=20000,
+            indexing_threshold=20000,
+            flush_interval_sec=5
+        ),
+        wal_config=WalConfigDiff(wal_capacity_mb=32)
+    )
+    COLLECTION_REGISTRY.add(collection_name)
+    PROVISIONED_PROFILES.record(collection_name, profile)
+    forget_search_params(collection_name)
+    print(f"🗂️ Created collection {collection_name} ({profile.name} profile)")
+    return profile
+
+
+# collection (or alias) name -> (SearchParams, read at), re-read after COLLECTION_REGISTRY_TTL
+# so other workers follow an alias moved to a collection with another profile
+_SEARCH_PARAMS = {}
+_SEARCH_PARAMS_LOCK = threading.Lock()
+
+
+def search_params_for(client: QdrantClient, collection_name: str) -> Optional[SearchParams]:
+    """Search-time hnsw_ef and rescoring for a collection, per its recorded profile.
+
+    An alias is resolved to the collection it points at. None for
+    collections without a recorded profile (created before profiles).
+    """
+    with _SEARCH_PARAMS_LOCK:
+        cached = _SEARCH_PARAMS.get(collection_name)
+    if cached is not None and time.monotonic() - cached[1] <= COLLECTION_REGISTRY_TTL:
+        return cached[0]
+    params = None
+    try:
+        profile = PROVISIONED_PROFILES.get(collection_name)
+        if profile is None:
+            target = next(
+                (item.collection_name for item in client.get_aliases().aliases if item.alias_name == collection_name),
+                None
+            )
+            profile = PROVISIONED_PROFILES.get(target) if target else None
+        if profile is not None:
+            params = SearchParams(
+                hnsw_ef=profile.ef,
+                quantization=QuantizationSearchParams(
+                    rescore=True,
+                    oversampling=profile.oversampling
+                ) if profile.quantize else None
+            )
+    except Exception as e:
+        logging.warning(f"Could not read search params of {collection_name}: {str(e)}")
+        return None
+    with _SEARCH_PARAMS_LOCK:
+        _SEARCH_PARAMS[collection_name] = (params, time.monotonic())
+    return params
+
+
+def forget_search_params(collection_name: str):
+    """Call when an alias moves to another collection, whose profile may differ."""
+    with _SEARCH_PARAMS_LOCK:
+        _SEARCH_PARAMS.pop(collection_name, None)
+
+
 def ensure_collection_exists(client: QdrantClient, collection_name: str):
     """Ensure collection exists with proper configuration"""
     try:
-        collections = client.get_collections()
-        collection_names = [collection.name for collection in collections.collections]
-        
-        if collection_name not in collection_names:
-            client.create_collection(
-                collection_name=collection_name,
-                vectors_config=VectorParams(
-                    size=COLLECTION_DIMENSIONS,
-                    distance=Distance.COSINE
-                ),
-                optimizers_config={
-                    "default_segment_number": 2,
-                    "max_optimization_threads": 4,
-                    "memmap_threshold": 20000,
-                    "indexing_threshold": 20000,
-                    "payload_indexing_threshold": 20000,
-                    "flush_interval_sec": 5
-                },
-                wal_config={
-                    "wal_capacity_mb": 32,
-                    "wal_segments_capacity_mb": 64
-                }
-            )
+        provision_collection(client, collection_name)
     except Exception as e:
         logging.error(f"Failed to ensure collection exists: {str(e)}")
         raise RuntimeError(f"Failed to ensure collection exists: {str(e)}")
@@ -63,7 +458,7 @@ def ensure_collection_exists(client: QdrantClient, collection_name: str):
 def get_embedding_model():
     return EMBEDDINGS  # Return the already-loaded model
 
-def get_vectorstore(client: QdrantClient, collection_name: str):
+def get_vectorstore(client: QdrantClient, collection_name: str, async_client: AsyncQdrantClient = None):
     try:
         # Ensure collection exists with proper configuration
         ensure_collection_exists(client, collection_name)
@@ -72,6 +467,7 @@ def get_vectorstore(client: QdrantClient, collection_name: str):
             client=client,
             collection_name=collection_name,
             embeddings=EMBEDDINGS,  # Use cached model directly
+            async_client=async_client,
             content_payload_key="page_content",
             metadata_payload_key="metadata"
         )
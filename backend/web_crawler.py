@@ -0,0 +1,320 @@
+import asyncio
+import hashlib
+import os
+import time
+from collections import deque
+from typing import Dict, List, Optional
+from urllib.parse import urldefrag, urljoin, urlsplit, urlunsplit, parse_qsl, urlencode
+from urllib.robotparser import RobotFileParser
+import xml.etree.ElementTree as ET
+
+import httpx
+from bs4 import BeautifulSoup
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain_core.documents import Document
+
+CRAWL_MAX_PAGES = int(os.getenv("CRAWL_MAX_PAGES", "10"))
+# Fetches in flight at once, over all hosts
+CRAWL_CONCURRENCY = int(os.getenv("CRAWL_CONCURRENCY", "16"))
+# Requests per second to one host, lowered further by a robots.txt Crawl-delay
+CRAWL_PER_HOST_RATE = float(os.getenv("CRAWL_PER_HOST_RATE", "8"))
+CRAWL_TIMEOUT = float(os.getenv("CRAWL_TIMEOUT", "10"))
+CRAWL_USER_AGENT = os.getenv("CRAWL_USER_AGENT", "PlugMindBot/1.0")
+# Sitemap files read at most (sitemap indexes can point to many)
+CRAWL_MAX_SITEMAPS = int(os.getenv("CRAWL_MAX_SITEMAPS", "5"))
+
+try:
+    import lxml  # noqa: F401
+    HTML_PARSER = "lxml"
+except ImportError:
+    HTML_PARSER = "html.parser"
+
+TRACKING_PARAMS = ("utm_", "fbclid", "gclid")
+SKIPPED_EXTENSIONS = (
+    ".pdf", ".zip", ".jpg", ".jpeg", ".png", ".gif", ".svg", ".webp", ".mp4", ".mp3",
+    ".css", ".js", ".ico", ".woff", ".woff2", ".xml",
+)
+
+
+def normalize_url(url: str) -> str:
+    """Canonical form of a URL for deduplication."""
+    url, _ = urldefrag(url)
+    parts = urlsplit(url)
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if parts.port and not ((scheme == "http" and parts.port == 80) or (scheme == "https" and parts.port == 443)):
+        host = f"{host}:{parts.port}"
+    path = parts.path or "/"
+    if path != "/" and path.endswith("/"):
+        path = path[:-1]
+    query = urlencode(sorted(
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not key.lower().startswith(TRACKING_PARAMS)
+    ))
+    return urlunsplit((scheme, host, path, query, ""))
+
+
+class HostRateLimiter:
+    """Spaces requests to the same host by at least 1 / rate seconds."""
+
+    def __init__(self, rate: float = CRAWL_PER_HOST_RATE):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._intervals = {}
+        self._next = {}
+        self._locks = {}
+
+    def set_delay(self, host: str, delay: float):
+        self._intervals[host] = max(self.interval, delay)
+
+    async def wait(self, host: str):
+        lock = self._locks.setdefault(host, asyncio.Lock())
+        interval = self._intervals.get(host, self.interval)
+        async with lock:
+            now = time.monotonic()
+            ready_at = self._next.get(host, 0.0)
+            if ready_at > now:
+                await asyncio.sleep(ready_at - now)
+            self._next[host] = max(now, ready_at) + interval
+
+
+class WebsiteCrawler:
+    """Breadth-first crawl of one site with concurrent, polite fetching.
+
+    Pages are taken from a deque frontier seeded with the start URL and the
+    site's sitemap, deduplicated on their normalized URL, and only fetched
+    when robots.txt allows it. The full visible text of each page is split
+    into chunks.
+
+    Given the previous crawl state, pages are requested conditionally and
+    only new or changed pages (by text hash) produce chunks.
+    """
+
+    def __init__(self, base_url: str, limit_pages: int = CRAWL_MAX_PAGES, concurrency: int = CRAWL_CONCURRENCY,
+                 chunk_size: int = 1000, chunk_overlap: int = 200, known: Optional[Dict[str, dict]] = None):
+        self.base_url = normalize_url(base_url)
+        # Pages under the start URL (or its folder, for a file URL) are in scope
+        self.scope = self._scope_of(self.base_url)
+        self.limit_pages = limit_pages
+        self.concurrency = concurrency
+        self.splitter = RecursiveCharacterTextSplitter(
+            chunk_size=chunk_size,
+            chunk_overlap=chunk_overlap,
+            length_function=len,
+            separators=["\n\n", "\n", " ", ""]
+        )
+        self.rate_limiter = HostRateLimiter()
+        self.robots: Optional[RobotFileParser] = None
+        self.frontier = deque()
+        self.seen = set()
+        # Crawl state from last time (see crawl_state.CrawlStateStore) and this crawl's
+        self.known = known or {}
+        self.pages = {}
+        self.unchanged = set()
+        # Known pages that could not be fetched this time; their content is kept
+        self.failed = set()
+
+    @staticmethod
+    def _scope_of(url: str) -> str:
+        parts = urlsplit(url)
+        path = parts.path
+        if "." in path.rsplit("/", 1)[-1]:
+            path = path.rsplit("/", 1)[0]
+        return urlunsplit((parts.scheme, parts.netloc, path.rstrip("/"), "", ""))
+
+    def in_scope(self, url: str) -> bool:
+        return url == self.scope or url.startswith(self.scope + "/") or url.startswith(self.scope + "?")
+
+    def allowed(self, url: str) -> bool:
+        return self.robots is None or self.robots.can_fetch(CRAWL_USER_AGENT, url)
+
+    def enqueue(self, url: str):
+        url = normalize_url(url)
+        if url in self.seen or not self.in_scope(url):
+            return
+        if urlsplit(url).path.lower().endswith(SKIPPED_EXTENSIONS):
+            return
+        self.seen.add(url)
+        if self.allowed(url):
+            self.frontier.append(url)
+
+    async def _get(self, client: httpx.AsyncClient, url: str, headers: Optional[dict] = None) -> httpx.Response:
+        await self.rate_limiter.wait(urlsplit(url).netloc)
+        return await client.get(url, headers=headers)
+
+    async def load_robots(self, client: httpx.AsyncClient) -> List[str]:
+        """Read robots.txt; returns the sitemaps it lists."""
+        parts = urlsplit(self.base_url)
+        robots_url = f"{parts.scheme}://{parts.netloc}/robots.txt"
+        try:
+            response = await self._get(client, robots_url)
+        except httpx.HTTPError:
+            return []
+        if response.status_code != 200:
+            return []
+        robots = RobotFileParser(robots_url)
+        robots.parse(response.text.splitlines())
+        self.robots = robots
+        delay = robots.crawl_delay(CRAWL_USER_AGENT)
+        if delay:
+            self.rate_limiter.set_delay(parts.netloc, float(delay))
+        return list(robots.site_maps() or [])
+
+    async def load_sitemaps(self, client: httpx.AsyncClient, sitemaps: List[str]):
+        """Seed the frontier from sitemap files, following sitemap indexes."""
+        if not sitemaps:
+            parts = urlsplit(self.base_url)
+            sitemaps = [f"{parts.scheme}://{parts.netloc}/sitemap.xml"]
+        pending = deque(sitemaps)
+        read = 0
+        while pending and read < CRAWL_MAX_SITEMAPS and len(self.frontier) < self.limit_pages * 2:
+            sitemap_url = pending.popleft()
+            read += 1
+            try:
+                response = await self._get(client, sitemap_url)
+                if response.status_code != 200:
+                    continue
+                root = ET.fromstring(response.content)
+            except (httpx.HTTPError, ET.ParseError):
+                continue
+            for loc in root.iter():
+                if not (isinstance(loc.tag, str) and loc.tag.endswith("loc")) or not loc.text:
+                    continue
+                if root.tag.endswith("sitemapindex"):
+                    pending.append(loc.text.strip())
+                else:
+                    self.enqueue(loc.text.strip())
+
+    async def fetch(self, client: httpx.AsyncClient, url: str):
+        """Fetch one page, conditionally if it was seen before.
+
+        Returns (url, html, response) for a usable HTML page, (url, None,
+        response) when the server answered 304, or None.
+        """
+        headers = {}
+        state = self.known.get(url)
+        if state:
+            if state.get("etag"):
+                headers["If-None-Match"] = state["etag"]
+            if state.get("last_modified"):
+                headers["If-Modified-Since"] = state["last_modified"]
+        try:
+            response = await self._get(client, url, headers)
+        except httpx.HTTPError:
+            if state:
+                self.failed.add(url)
+            return None
+        if response.status_code == 304 and state:
+            return url, None, response
+        if response.status_code != 200 or "html" not in response.headers.get("content-type", "html"):
+            if state and response.status_code >= 500:
+                # Server trouble, not a removed page
+                self.failed.add(url)
+            return None
+        return str(response.url), response.text, response
+
+    def parse(self, url: str, html: str):
+        """Return (normalized url, title, visible text, links) of a page."""
+        soup = BeautifulSoup(html, HTML_PARSER)
+
+        # Internal links, resolved against the URL as served (not normalized)
+        links = [normalize_url(urljoin(url, link["href"])) for link in soup.find_all("a", href=True)]
+
+        for tag in soup(["script", "style", "noscript", "template"]):
+            tag.decompose()
+        title = soup.title.get_text(strip=True) if soup.title else ""
+        # Extract visible text
+        text = soup.get_text(separator="\n", strip=True)
+        return normalize_url(url), title, text, links
+
+    def handle(self, url: str, html: Optional[str], response: httpx.Response) -> Optional[List[Document]]:
+        """Record a fetched page; returns its chunks if it is new or changed.
+
+        None if the page was already handled in this crawl under the URL it
+        redirected to (http -> https, trailing slash...).
+        """
+        final_url = normalize_url(url)
+        if final_url in self.pages:
+            return None
+        # Not fetched again if a link to the final URL turns up later
+        self.seen.add(final_url)
+        if html is None:
+            # 304 Not Modified: reuse what we know, links included
+            self.pages[url] = dict(self.known[url])
+            self.unchanged.add(url)
+            for link in self.known[url].get("links", []):
+                self.enqueue(link)
+            return []
+
+        url, title, text, links = self.parse(url, html)
+        for link in links:
+            self.enqueue(link)
+        links = sorted({link for link in links if self.in_scope(link)})
+        content_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        self.pages[url] = {
+            "etag": response.headers.get("etag"),
+            "last_modified": response.headers.get("last-modified"),
+            "content_hash": content_hash,
+            "links": links,
+        }
+        if self.known.get(url, {}).get("content_hash") == content_hash:
+            self.unchanged.add(url)
+            return []
+        return [
+            Document(page_content=piece, metadata={"source": "web", "url": url, "title": title})
+            for piece in self.splitter.split_text(text)
+        ]
+
+    async def crawl(self) -> List[Document]:
+        """Crawl the site; returns the chunks of new and changed pages."""
+        chunks = []
+        pages_scraped = 0
+        limits = httpx.Limits(max_connections=self.concurrency, max_keepalive_connections=self.concurrency)
+        async with httpx.AsyncClient(
+            headers={"User-Agent": CRAWL_USER_AGENT},
+            timeout=CRAWL_TIMEOUT,
+            limits=limits,
+            follow_redirects=True,
+        ) as client:
+            sitemaps = await self.load_robots(client)
+            self.enqueue(self.base_url)
+            # Pages seen last time come first, so a refresh revisits them all
+            for url in self.known:
+                self.enqueue(url)
+            await self.load_sitemaps(client, sitemaps)
+
+            in_flight = set()
+            while (self.frontier or in_flight) and pages_scraped < self.limit_pages:
+                # Never start more fetches than pages left to scrape
+                while self.frontier and len(in_flight) < self.concurrency and pages_scraped + len(in_flight) < self.limit_pages:
+                    in_flight.add(asyncio.ensure_future(self.fetch(client, self.frontier.popleft())))
+                if not in_flight:
+                    break
+                done, in_flight = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    result = task.result()
+                    if result is None or pages_scraped >= self.limit_pages:
+                        continue
+                    url, html, response = result
+                    if not pages_scraped and not self.in_scope(normalize_url(url)):
+                        # The start page redirected (http -> https, www...): follow the site there
+                        self.scope = self._scope_of(normalize_url(url))
+                    try:
+                        page_chunks = self.handle(url, html, response)
+                        if page_chunks is None:
+                            continue
+                        chunks.extend(page_chunks)
+                        pages_scraped += 1
+                    except Exception as e:
+                        print(f"⚠️ Failed to parse {url}: {str(e)}")
+                        if url in self.known:
+                            self.failed.add(url)
+
+            for task in in_flight:
+                task.cancel()
+
+        print(f"🌐 Crawled {pages_scraped} pages from {self.base_url} ({len(self.unchanged)} unchanged)")
+        return chunks
+
+
+async def crawl_website(base_url: str, limit_pages: int = CRAWL_MAX_PAGES) -> List[Document]:
+    return await WebsiteCrawler(base_url, limit_pages).crawl()
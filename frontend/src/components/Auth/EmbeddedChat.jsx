@@ -44,32 +44,97 @@ const EmbeddedChat = ({ chatbotId, chatbotName, greetingMessage }) => {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
+          Accept: 'text/event-stream',
         },
         body: JSON.stringify({
           message: userMessage.text,
           language: lang,
+          stream: true,
         }),
       });
 
-      const data = await res.json();
-      console.log("📥 Full API response:", data);
-
-      let botReply = '';
-      if (typeof data.answer === 'string' && data.answer.trim().length > 0) {
-        botReply = data.answer.trim();
-      } else {
-        console.warn("❌ Missing or empty 'answer' in API response");
-        botReply = '❌ No valid answer in response.';
+      const contentType = res.headers.get('content-type') || '';
+      if (!res.ok || !res.body || !contentType.includes('text/event-stream')) {
+        const data = await res.json();
+        console.log("📥 Full API response:", data);
+
+        let botReply = '';
+        if (typeof data.answer === 'string' && data.answer.trim().length > 0) {
+          botReply = data.answer.trim();
+        } else {
+          console.warn("❌ Missing or empty 'answer' in API response");
+          botReply = '❌ No valid answer in response.';
+        }
+
+        setMessages((prev) => [
+          ...prev,
+          {
+            from: 'bot',
+            text: botReply,
+            time: new Date().toLocaleTimeString(),
+          },
+        ]);
+        return;
       }
 
+      // Streamed reply: show tokens as they arrive in a single bot message
+      let botReply = '';
       setMessages((prev) => [
         ...prev,
         {
           from: 'bot',
-          text: botReply,
+          text: '',
           time: new Date().toLocaleTimeString(),
         },
       ]);
+      const updateBotReply = (text) => {
+        setMessages((prev) => {
+          const next = [...prev];
+          next[next.length - 1] = { ...next[next.length - 1], text };
+          return next;
+        });
+      };
+
+      const reader = res.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = '';
+
+      while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        // SSE events are separated by a blank line
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+          const rawEvent = buffer.slice(0, boundary);
+          buffer = buffer.slice(boundary + 2);
+
+          let event = 'message';
+          let data = '';
+          rawEvent.split('\n').forEach((line) => {
+            if (line.startsWith('event:')) event = line.slice(6).trim();
+            else if (line.startsWith('data:')) data += line.slice(5).trim();
+          });
+          if (!data) continue;
+
+          const payload = JSON.parse(data);
+          if (event === 'token') {
+            botReply += payload.token;
+            updateBotReply(botReply);
+          } else if (event === 'sources') {
+            console.log("📚 Sources:", payload.sources);
+          } else if (event === 'error') {
+            console.warn("❌ Stream error:", payload.message);
+          }
+        }
+      }
+
+      if (!botReply.trim()) {
+        updateBotReply('❌ No valid answer in response.');
+      } else {
+        updateBotReply(botReply.trim());
+      }
     } catch (err) {
       console.error("❌ Fetch error:", err);
       setMessages((prev) => [